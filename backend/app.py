@@ -1,32 +1,64 @@
 # app.py
 import os
 import io
-import json
+import re
 import time
 import asyncio
 import hashlib
+import logging
+import queue
 import base64
-from typing import Optional, Any, Dict, List, Literal, Tuple
-
-from fastapi import FastAPI, UploadFile, File, Form
+import secrets
+from typing import Optional, Any, AsyncIterator, Deque, Dict, Final, List, Literal, Mapping, NamedTuple, Tuple
+from types import MappingProxyType
+from dataclasses import dataclass, asdict
+from functools import lru_cache, partial
+from collections import deque
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener
+
+from fastapi import FastAPI, UploadFile, File, Form, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.websockets import WebSocketState
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
 from dotenv import load_dotenv
+from cachetools import TTLCache
+import orjson
+from anyio import to_thread
 import redis
+from redis.asyncio import Redis as AsyncRedis, ConnectionPool
 import PIL.Image
 
-import google.generativeai as genai
+import httpx
 
 # =========================
 # Optional: Groq client
 # =========================
 GROQ_AVAILABLE = False
 try:
-    from groq import Groq  # pip install groq
+    from groq import AsyncGroq  # pip install groq
     GROQ_AVAILABLE = True
 except Exception:
     GROQ_AVAILABLE = False
 
+# =========================
+# Optional: xxhash (fast non-crypto frame fingerprint)
+# =========================
+XXHASH_AVAILABLE = False
+try:
+    import xxhash  # pip install xxhash
+    XXHASH_AVAILABLE = True
+except Exception:
+    XXHASH_AVAILABLE = False
+
+# Optional: HTTP/2 for the Gemini client (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
 # 너가 만든 모듈들 (RAG)
 try:
     from rag_index import rag_retrieve
@@ -46,6 +78,7 @@ except Exception as e:
 try:
     from reasoner import refine_observation_and_build_query
     from planner import generate_fix_plan
+    import llama_client
     from schemas import VectorRetrievalMetrics, SolutionResponseV2
     LLAMA_ENABLED = True
     print("✅ Llama reasoning pipeline loaded")
@@ -69,7 +102,7 @@ except Exception as e:
 # Load env first, then read keys
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY", "").strip()
 
@@ -92,11 +125,41 @@ REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
 REDIS_DB = int(os.environ.get("REDIS_DB", "0"))
 REDIS_TTL_SECONDS = int(os.environ.get("REDIS_TTL_SECONDS", "86400"))
+# per key class: guide state/plan are small + re-read every step, solution blobs are
+# large and write-mostly (each /solution call rewrites them)
+REDIS_TTL_GUIDE_SECONDS = int(os.environ.get("REDIS_TTL_GUIDE_SECONDS", "3600"))
+REDIS_TTL_SOLUTION_SECONDS = int(os.environ.get("REDIS_TTL_SOLUTION_SECONDS", "900"))
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", "64"))
 
 MIN_SECONDS_PER_SESSION = float(os.environ.get("MIN_SECONDS_PER_SESSION", "4"))
+# dHash bits allowed to differ before two frames count as "the same scene"
+DEDUP_HAMMING_THRESHOLD = int(os.environ.get("DEDUP_HAMMING_THRESHOLD", "5"))
+HISTORY_PARSE_OFFLOAD_BYTES = int(os.environ.get("HISTORY_PARSE_OFFLOAD_BYTES", "262144"))
+# Long-edge cap for frames sent to Gemini; fixture classification doesn't need more
+MAX_IMAGE_SIDE = int(os.environ.get("MAX_IMAGE_SIDE", "1024"))
+# JPEG quality when a downscaled frame has to be re-encoded for upload
+GEMINI_JPEG_QUALITY = int(os.environ.get("GEMINI_JPEG_QUALITY", "80"))
 REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "20"))
 
 LOCK_TTL_SECONDS = int(os.environ.get("LOCK_TTL_SECONDS", "30"))
+# Fire-and-forget analysis writes allowed in flight before /frame awaits inline
+MAX_PENDING_WRITES = int(os.environ.get("MAX_PENDING_WRITES", "256"))
+
+# Upper bound for per-session in-process maps (evicted LRU / by TTL)
+SESSION_CACHE_MAX = int(os.environ.get("SESSION_CACHE_MAX", "10000"))
+
+# Identical image bytes (+ same spoken context) reuse a previous extraction
+FRAME_CACHE_TTL_SECONDS = int(os.environ.get("FRAME_CACHE_TTL_SECONDS", "86400"))
+FRAME_CACHE_MAX = int(os.environ.get("FRAME_CACHE_MAX", "1024"))
+# worker processes serving this app (the __main__ runner exports UVICORN_WORKERS;
+# WEB_CONCURRENCY is what `uvicorn --workers` / gunicorn setups usually set)
+WORKER_COUNT = int(os.environ.get("UVICORN_WORKERS") or os.environ.get("WEB_CONCURRENCY") or "1")
+# in-process read cache in front of the Redis guide state (0 disables).
+# Single worker only: with several, a step landing on another worker would read
+# this worker's stale copy and overwrite the newer state.
+GUIDE_STATE_CACHE_TTL_SECONDS = float(os.environ.get("GUIDE_STATE_CACHE_TTL_SECONDS", "2")) if WORKER_COUNT == 1 else 0.0
+# /debug/redis (DBSIZE + KEYS scan) is served from memory for this long
+DEBUG_REDIS_CACHE_TTL_SECONDS = float(os.environ.get("DEBUG_REDIS_CACHE_TTL_SECONDS", "5"))
 
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "").strip()
 if not GEMINI_API_KEY:
@@ -104,37 +167,149 @@ if not GEMINI_API_KEY:
 
 # ✅ 안정 모델 기본값 (필요하면 .env에서 GEMINI_MODEL 바꿔서 테스트)
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "").strip() or "gemini-2.0-flash"
+# Per-process cap on concurrent Gemini requests (async httpx, no threads involved):
+# bounds in-flight upstream calls so bursts queue here instead of hitting quota / 429s
+GEMINI_MAX_INFLIGHT = int(os.environ.get("GEMINI_MAX_INFLIGHT", "8"))
+# anyio worker-thread pool size shared by to_thread / sync endpoints (default 40)
+THREADPOOL_TOKENS = int(os.environ.get("THREADPOOL_TOKENS", "100"))
+
+# /solution toilet path: reuse the speculative RAG result when this share of
+# Reasoner ①'s query words also appear in the heuristic prefetch query
+RAG_PREFETCH_MIN_OVERLAP = float(os.environ.get("RAG_PREFETCH_MIN_OVERLAP", "0.6"))
 
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "").strip()
 GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama-3.1-70b-versatile").strip()
 
+# Backstage socket in in-memory mode: how often it checks the session for changes
+BACKSTAGE_MEM_POLL_SECONDS = float(os.environ.get("BACKSTAGE_MEM_POLL_SECONDS", "0.5"))
+# Backstage sockets in Redis mode each hold a pubsub connection (own pool, not redis_pool)
+BACKSTAGE_MAX_SUBSCRIBERS = int(os.environ.get("BACKSTAGE_MAX_SUBSCRIBERS", "8"))
+
+# reasoner/planner stage logs; DEBUG brings back the per-call "Calling Llama..." lines
+SOLUTION_LOG_LEVEL = os.environ.get("SOLUTION_LOG_LEVEL", "INFO").strip().upper()
+
+# ----------------------------
+# Logging (/solution pipeline)
+# ----------------------------
+# reasoner / planner / llama_client log to "solution.*". On the request path a
+# record is only put on a queue; formatting + the stderr write happen on the
+# QueueListener thread, and %-args below the level are never formatted at all.
+solution_log = logging.getLogger("solution")
+solution_log.setLevel(SOLUTION_LOG_LEVEL)
+solution_log.propagate = False
+_solution_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+solution_log.addHandler(QueueHandler(_solution_log_queue))
+_solution_log_handler = logging.StreamHandler()
+_solution_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+solution_log_listener = QueueListener(_solution_log_queue, _solution_log_handler)
+
+@app.on_event("startup")
+async def start_solution_log():
+    solution_log_listener.start()
+
+@app.on_event("shutdown")
+async def stop_solution_log():
+    # flushes whatever is still queued
+    solution_log_listener.stop()
+
+# ----------------------------
+# JSON helpers (orjson; str output for prompts, non-ASCII kept as-is)
+# ----------------------------
+def _dumps(obj: Any, indent: bool = False) -> str:
+    opts = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    return orjson.dumps(obj, default=str, option=opts).decode()
+
 # ----------------------------
 # Redis connection (fallback to in-memory)
 # ----------------------------
-analysis_history: Dict[str, List[dict]] = {}
+# newest first, capped at 50 (same window as the Redis LTRIM)
+analysis_history: Dict[str, Deque[dict]] = {}
 latest_by_session: Dict[str, dict] = {}
 status_by_session: Dict[str, str] = {}
 last_call_by_session: Dict[str, float] = {}
-last_hash_by_session: Dict[str, str] = {}
+# dedup fingerprints: bounded + expiring like their Redis keys (one entry per session)
+last_hash_by_session: TTLCache = TTLCache(maxsize=SESSION_CACHE_MAX, ttl=REDIS_TTL_SECONDS)
+last_phash_by_session: TTLCache = TTLCache(maxsize=SESSION_CACHE_MAX, ttl=REDIS_TTL_SECONDS)
+latest_etag_by_session: Dict[str, str] = {}
 
-guide_state_by_session: Dict[str, dict] = {}
+# live GuideState objects (every mutation is followed by save_guide_state); bounded like the Redis keys
+guide_state_by_session: TTLCache = TTLCache(maxsize=SESSION_CACHE_MAX, ttl=REDIS_TTL_SECONDS)
 notes_by_session: Dict[str, List[dict]] = {}
 
 
-try:
-    redis_client = redis.Redis(
-        host=REDIS_HOST,
-        port=REDIS_PORT,
-        db=REDIS_DB,
-        decode_responses=True,
-        socket_connect_timeout=2,
-    )
-    redis_client.ping()
-    USE_REDIS = True
-    print(f"✅ Connected to Redis at {REDIS_HOST}:{REDIS_PORT} db={REDIS_DB}")
-except (redis.ConnectionError, redis.TimeoutError) as e:
-    USE_REDIS = False
-    print(f"⚠️ Redis not available ({e}), using in-memory storage")
+# One shared pool for the whole process; async client so a Redis round-trip
+# never blocks the event loop. USE_REDIS is decided by the startup ping.
+# Values come back as raw bytes: JSON payloads go straight to orjson.loads
+# without a UTF-8 decode + str copy first.
+# (Plain ConnectionPool on purpose: redis-py 5.0.x's async BlockingConnectionPool
+# stalls for its full timeout when the server refuses the connection.)
+redis_pool = ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+    decode_responses=False,
+    socket_connect_timeout=2,
+    socket_keepalive=True,
+    health_check_interval=30,
+    max_connections=REDIS_MAX_CONNECTIONS,
+)
+redis_client = AsyncRedis(connection_pool=redis_pool)
+USE_REDIS = False
+
+# Backstage pubsub subscriptions pin a connection each for as long as a viewer
+# tab is open: separate, capped pool so they can never starve /frame.
+backstage_pubsub_pool = ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+    decode_responses=False,
+    socket_connect_timeout=2,
+    socket_keepalive=True,
+    health_check_interval=30,
+    max_connections=BACKSTAGE_MAX_SUBSCRIBERS,
+)
+backstage_redis = AsyncRedis(connection_pool=backstage_pubsub_pool)
+
+@app.on_event("startup")
+async def widen_threadpool():
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_TOKENS
+
+@app.on_event("startup")
+async def connect_redis():
+    global USE_REDIS
+    try:
+        await redis_client.ping()
+        USE_REDIS = True
+        print(f"✅ Connected to Redis at {REDIS_HOST}:{REDIS_PORT} db={REDIS_DB}")
+        if LLAMA_ENABLED:
+            # Llama response cache shared by every worker
+            llama_client.response_cache_redis = redis_client
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        USE_REDIS = False
+        print(f"⚠️ Redis not available ({e}), using in-memory storage")
+
+groq_warmup_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def warm_llama_client():
+    global groq_warmup_task
+    if LLAMA_ENABLED:
+        # background: a slow Groq handshake must not hold up startup
+        groq_warmup_task = asyncio.create_task(llama_client.warm_groq_connection())
+
+@app.on_event("shutdown")
+async def close_llama_client():
+    if LLAMA_ENABLED:
+        if groq_warmup_task is not None and not groq_warmup_task.done():
+            groq_warmup_task.cancel()
+        await llama_client.close_groq_client()
+
+@app.on_event("shutdown")
+async def close_redis():
+    if _pending_writes:
+        await asyncio.gather(*_pending_writes, return_exceptions=True)
+    await backstage_pubsub_pool.disconnect()
+    await redis_pool.disconnect()
 
 # ----------------------------
 # CORS
@@ -159,9 +334,63 @@ app.add_middleware(
 # ----------------------------
 # Gemini
 # ----------------------------
-genai.configure(api_key=GEMINI_API_KEY)
 print("🤖 Gemini model:", GEMINI_MODEL)
-model = genai.GenerativeModel(GEMINI_MODEL)
+GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+
+# One keep-alive (HTTP/2 when h2 is installed) client for every Gemini call:
+# concurrent frames multiplex over the same TLS connection, no thread hop.
+gemini_http: Optional[httpx.AsyncClient] = None
+
+GEMINI_SEM = asyncio.Semaphore(GEMINI_MAX_INFLIGHT)
+
+@app.on_event("startup")
+async def open_gemini_client():
+    global gemini_http
+    gemini_http = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        headers={"x-goog-api-key": GEMINI_API_KEY},
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        timeout=REQUEST_TIMEOUT_SECONDS,
+    )
+
+@app.on_event("shutdown")
+async def close_gemini_client():
+    if gemini_http is not None:
+        await gemini_http.aclose()
+
+def _gemini_part(p) -> dict:
+    if isinstance(p, dict):
+        # already-encoded image: {"mime_type": ..., "data": bytes}
+        return {"inline_data": {"mime_type": p["mime_type"], "data": base64.b64encode(p["data"]).decode("ascii")}}
+    if isinstance(p, PIL.Image.Image):
+        return {"inline_data": {"mime_type": "image/jpeg", "data": base64.b64encode(encode_jpeg(p)).decode("ascii")}}
+    return {"text": str(p)}
+
+# JSON mode: the model emits bare JSON (no fences / commentary). The schema itself
+# stays in the prompt + pydantic: responseSchema only takes an OpenAPI subset
+# (no $defs/$ref) that our nested models don't map onto cleanly.
+GEMINI_JSON_CONFIG: Final[dict] = {"responseMimeType": "application/json"}
+
+async def gemini_generate_text(parts: list, json_mode: bool = False) -> str:
+    """
+    generateContent over REST. parts: str prompts, PIL images, or
+    {"mime_type", "data"} dicts of already-encoded image bytes.
+    json_mode=True asks for application/json output.
+    Gated by GEMINI_SEM to cap in-flight upstream calls; callers still wrap
+    this in asyncio.wait_for, so the timeout covers queueing too.
+    Returns the concatenated text of the first candidate.
+    """
+    body = {"contents": [{"role": "user", "parts": [_gemini_part(p) for p in parts]}]}
+    if json_mode:
+        body["generationConfig"] = GEMINI_JSON_CONFIG
+    async with GEMINI_SEM:
+        r = await gemini_http.post(GEMINI_URL, content=orjson.dumps(body), headers={"Content-Type": "application/json"})
+    r.raise_for_status()
+    out = orjson.loads(r.content)
+    candidates = out.get("candidates") or []
+    if not candidates:
+        raise RuntimeError(f"Gemini returned no candidates: {out.get('promptFeedback')}")
+    return "".join(p.get("text", "") for p in (candidates[0].get("content") or {}).get("parts") or [])
 
 # ----------------------------
 # Groq
@@ -169,7 +398,7 @@ model = genai.GenerativeModel(GEMINI_MODEL)
 groq_client = None
 if GROQ_AVAILABLE and GROQ_API_KEY:
     try:
-        groq_client = Groq(api_key=GROQ_API_KEY)
+        groq_client = AsyncGroq(api_key=GROQ_API_KEY)
         print("✅ Groq client ready")
     except Exception as e:
         groq_client = None
@@ -178,128 +407,458 @@ if GROQ_AVAILABLE and GROQ_API_KEY:
 # ----------------------------
 # Redis key helpers
 # ----------------------------
+class SessionKeys(NamedTuple):
+    latest: str
+    history: str
+    status: str
+    last_call: str
+    last_hash: str
+    latest_etag: str
+    last_phash: str
+    solution_latest: str
+    lock: str
+    guide_state: str
+    guide_plan: str
+    notes: str
+
+@lru_cache(maxsize=SESSION_CACHE_MAX)
+def session_keys(session_id: str) -> SessionKeys:
+    """All Redis key names for a session, formatted once and reused across requests."""
+    p = f"session:{session_id}:"
+    return SessionKeys(
+        latest=p + "latest",
+        history=p + "history",
+        status=p + "status",
+        last_call=p + "last_call",
+        last_hash=p + "last_hash",
+        latest_etag=p + "latest_etag",
+        last_phash=p + "last_phash",
+        solution_latest=p + "solution:latest",
+        lock=p + "lock",
+        guide_state=p + "guide:state",
+        guide_plan=p + "guide:plan",
+        notes=p + "notes",
+    )
+
 def k_latest(session_id: str) -> str:
-    return f"session:{session_id}:latest"
+    return session_keys(session_id).latest
 
 def k_history(session_id: str) -> str:
-    return f"session:{session_id}:history"
+    return session_keys(session_id).history
 
 def k_status(session_id: str) -> str:
-    return f"session:{session_id}:status"
+    return session_keys(session_id).status
 
 def k_last_call(session_id: str) -> str:
-    return f"session:{session_id}:last_call"
+    return session_keys(session_id).last_call
 
 def k_last_hash(session_id: str) -> str:
-    return f"session:{session_id}:last_hash"
+    return session_keys(session_id).last_hash
+
+def k_latest_etag(session_id: str) -> str:
+    return session_keys(session_id).latest_etag
+
+def k_last_phash(session_id: str) -> str:
+    return session_keys(session_id).last_phash
 
 def k_solution_latest(session_id: str) -> str:
-    return f"session:{session_id}:solution:latest"
+    return session_keys(session_id).solution_latest
 
 def k_lock(session_id: str) -> str:
-    return f"session:{session_id}:lock"
+    return session_keys(session_id).lock
 
 def k_guide_state(session_id: str) -> str:
-    return f"session:{session_id}:guide:state"
+    return session_keys(session_id).guide_state
 
 def k_guide_plan(session_id: str) -> str:
-    return f"session:{session_id}:guide:plan"
+    return session_keys(session_id).guide_plan
 
 # ----------------------------
 # State store helpers
 # ----------------------------
-def set_status(session_id: str, status: str):
+async def set_status(session_id: str, status: str):
     if USE_REDIS:
-        redis_client.set(k_status(session_id), status, ex=REDIS_TTL_SECONDS)
+        await redis_client.set(k_status(session_id), status, ex=REDIS_TTL_SECONDS)
     else:
         status_by_session[session_id] = status
 
-def get_status(session_id: str) -> str:
+async def get_status(session_id: str) -> str:
     if USE_REDIS:
-        s = redis_client.get(k_status(session_id))
-        return s or "idle"
+        s = await redis_client.get(k_status(session_id))
+        return s.decode() if s else "idle"
     return status_by_session.get(session_id, "idle")
 
-def should_throttle(session_id: str) -> bool:
-    now = time.time()
-    if USE_REDIS:
-        last = redis_client.get(k_last_call(session_id))
-        last = float(last) if last else 0.0
-        return (now - last) < MIN_SECONDS_PER_SESSION
+# In-memory counterparts of FRAME_PRECHECK_LUA (Redis mode runs that script instead)
+async def should_throttle(session_id: str) -> bool:
     last = last_call_by_session.get(session_id, 0.0)
-    return (now - last) < MIN_SECONDS_PER_SESSION
+    return (time.time() - last) < MIN_SECONDS_PER_SESSION
 
-def set_last_call(session_id: str):
-    now = time.time()
-    if USE_REDIS:
-        redis_client.set(k_last_call(session_id), str(now), ex=REDIS_TTL_SECONDS)
-    else:
-        last_call_by_session[session_id] = now
+async def set_last_call(session_id: str):
+    last_call_by_session[session_id] = time.time()
 
-def is_duplicate_frame(session_id: str, raw_image: bytes) -> bool:
-    h = hashlib.sha256(raw_image).hexdigest()
-    if USE_REDIS:
-        prev = redis_client.get(k_last_hash(session_id))
-        if prev == h:
-            return True
-        redis_client.set(k_last_hash(session_id), h, ex=REDIS_TTL_SECONDS)
-        return False
+def frame_hash(raw_image: bytes) -> str:
+    # dedup only needs "same bytes as last frame" -> no crypto hash needed.
+    # Length prefix: frames of different size can never collide.
+    if XXHASH_AVAILABLE:
+        return f"{len(raw_image)}:{xxhash.xxh3_64_hexdigest(raw_image)}"
+    return f"{len(raw_image)}:{hashlib.blake2b(raw_image, digest_size=8).hexdigest()}"
+
+async def is_duplicate_frame(session_id: str, h: str) -> bool:
     prev = last_hash_by_session.get(session_id)
     if prev == h:
         return True
     last_hash_by_session[session_id] = h
     return False
 
-def store_analysis(session_id: str, data: dict, raw_response: Optional[str] = None):
-    entry = {"timestamp": time.time(), "data": data, "raw_response": raw_response}
+# ----------------------------
+# Cross-session extraction cache (content hash -> validated extraction JSON)
+# ----------------------------
+def k_frame_cache(fh: str, user_context: str = "") -> str:
+    # spoken context changes the prompt, so it is part of the key
+    if user_context:
+        return f"frame:cache:{fh}:{frame_hash(user_context.encode())}"
+    return f"frame:cache:{fh}"
+
+frame_cache_local: TTLCache = TTLCache(maxsize=FRAME_CACHE_MAX, ttl=FRAME_CACHE_TTL_SECONDS)
+
+async def get_cached_extraction(key: str) -> Optional[bytes]:
+    if USE_REDIS:
+        return await redis_client.get(key)
+    return frame_cache_local.get(key)
+
+async def put_cached_extraction(key: str, payload: bytes):
+    if USE_REDIS:
+        await redis_client.set(key, payload, ex=FRAME_CACHE_TTL_SECONDS)
+    else:
+        frame_cache_local[key] = payload
+
+# LPUSH + LTRIM(0..49) + EXPIREAT as one server-side command
+# KEYS: history | ARGV: payload, expire_at (unix seconds)
+HISTORY_PUSH_LUA = """
+redis.call('LPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], 0, 49)
+redis.call('EXPIREAT', KEYS[1], ARGV[2])
+return 1
+"""
+history_push_script = redis_client.register_script(HISTORY_PUSH_LUA)
+
+async def store_analysis(session_id: str, data: dict, raw_response: Optional[str] = None):
+    # raw_response (up to 4KB of model output, debug only) lives on the latest
+    # snapshot; the 50-deep history keeps just {timestamp, data}.
+    hist_entry = {"timestamp": time.time(), "data": data}
+    entry = {**hist_entry, "raw_response": raw_response}
+    # version tag for conditional GETs on /latest and /history
+    etag = str(time.time_ns())
     if USE_REDIS:
-        redis_client.set(k_latest(session_id), json.dumps(entry), ex=REDIS_TTL_SECONDS)
-        redis_client.lpush(k_history(session_id), json.dumps(entry))
-        redis_client.ltrim(k_history(session_id), 0, 49)
-        redis_client.expire(k_history(session_id), REDIS_TTL_SECONDS)
+        # ship all writes in one MULTI/EXEC round-trip;
+        # every key gets the same absolute expiry computed here
+        expire_at = int(entry["timestamp"]) + REDIS_TTL_SECONDS
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.set(k_latest(session_id), orjson.dumps(entry), exat=expire_at)
+        pipe.set(k_latest_etag(session_id), etag, exat=expire_at)
+        await history_push_script(keys=[k_history(session_id)], args=[orjson.dumps(hist_entry), expire_at], client=pipe)
+        await pipe.execute()
     else:
         latest_by_session[session_id] = entry
-        analysis_history.setdefault(session_id, []).append(entry)
-        analysis_history[session_id] = analysis_history[session_id][-50:]
+        latest_etag_by_session[session_id] = etag
+        analysis_history.setdefault(session_id, deque(maxlen=50)).appendleft(hist_entry)
 
-def get_latest(session_id: str) -> Optional[dict]:
+# Writes still in flight from background_write (drained on shutdown)
+_pending_writes: set = set()
+write_log = logging.getLogger("solution.writes")
+
+def _on_write_done(label: str, task: asyncio.Task):
+    _pending_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        write_log.warning("⚠️ %s failed: %r", label, task.exception())
+
+async def background_write(coro, label: str = "store_analysis") -> Optional[asyncio.Task]:
+    """
+    Run a write coroutine as a tracked task so the caller doesn't wait for Redis.
+    Past MAX_PENDING_WRITES we await inline instead (backpressure, no unbounded growth)
+    and return None; otherwise the task. label names the write in failure logs.
+    """
+    if len(_pending_writes) >= MAX_PENDING_WRITES:
+        await coro
+        return None
+    task = asyncio.create_task(coro)
+    _pending_writes.add(task)
+    task.add_done_callback(partial(_on_write_done, label))
+    return task
+
+async def store_analysis_background(session_id: str, data: dict, raw_response: Optional[str] = None):
+    await background_write(store_analysis(session_id, data, raw_response=raw_response))
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check: comma lists, weak W/ tags, quoted or bare values, "*"."""
+    if not if_none_match:
+        return False
+    want = etag.strip('"')
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') == want:
+            return True
+    return False
+
+async def get_latest_etag(session_id: str) -> Optional[str]:
+    """Quoted ETag for the session's current analysis, or None if nothing stored yet."""
+    if USE_REDIS:
+        v = await redis_client.get(k_latest_etag(session_id))
+        return f'"{v.decode()}"' if v else None
+    v = latest_etag_by_session.get(session_id)
+    return f'"{v}"' if v else None
+
+async def get_latest(session_id: str) -> Optional[dict]:
     if USE_REDIS:
-        raw = redis_client.get(k_latest(session_id))
-        return json.loads(raw) if raw else None
+        raw = await redis_client.get(k_latest(session_id))
+        return orjson.loads(raw) if raw else None
     return latest_by_session.get(session_id)
 
-def get_history(session_id: str, limit: int = 50):
+def history_page_size(limit: int) -> int:
+    """Entries a /history?limit= request actually gets: 0..50 (the 50 we keep)."""
+    return max(0, min(limit, 50))
+
+async def get_history(session_id: str, limit: int = 50):
+    # LRANGE 0..limit-1 with limit<=0 would mean "whole list": clamp to the 50 we keep
+    limit = history_page_size(limit)
+    if limit <= 0:
+        return []
+    if USE_REDIS:
+        items = await redis_client.lrange(k_history(session_id), 0, limit - 1)
+        # Big pages (raw_response can be several KB per entry) are parsed off
+        # the event loop so one /history call doesn't stall every other request.
+        if sum(map(len, items)) > HISTORY_PARSE_OFFLOAD_BYTES:
+            return await asyncio.to_thread(lambda: list(map(orjson.loads, items)))
+        return list(map(orjson.loads, items))
+    return list(islice(analysis_history.get(session_id, ()), limit))
+
+# ----------------------------
+# Perceptual (near-duplicate) frame check
+# ----------------------------
+# Upload formats Gemini accepts as-is (PIL format name -> MIME type)
+GEMINI_PASSTHROUGH_MIME = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+def prepare_frame(raw_image: bytes) -> Tuple[dict, str]:
+    """
+    Returns (Gemini image part as {"mime_type", "data"}, dHash hex).
+    CPU-bound (decode/resize/encode): /frame runs it in a worker thread.
+
+    Small uploads in a format Gemini accepts are sent as the client's own
+    bytes; their pixels are only needed for the 9x8 dHash, so JPEGs are
+    decoded at 1/8 scale, greyscale. Anything bigger than MAX_IMAGE_SIDE
+    (or in another format) is decoded once, downscaled and re-encoded as
+    JPEG at GEMINI_JPEG_QUALITY.
+    """
+    img = PIL.Image.open(io.BytesIO(raw_image))  # header only, no pixels yet
+    mime = GEMINI_PASSTHROUGH_MIME.get(img.format)
+    if mime and max(img.size) <= MAX_IMAGE_SIDE:
+        img.draft("L", (64, 64))  # no-op for non-JPEG
+        img.load()
+        return {"mime_type": mime, "data": raw_image}, dhash_hex(img)
+    pil_image = decode_frame(img)
+    return {"mime_type": "image/jpeg", "data": encode_jpeg(pil_image)}, dhash_hex(pil_image)
+
+def encode_jpeg(img: PIL.Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=GEMINI_JPEG_QUALITY, optimize=False)
+    return buf.getvalue()
+
+def decode_frame(img: PIL.Image.Image) -> PIL.Image.Image:
+    """Decode an opened upload, capped at MAX_IMAGE_SIDE on the long edge."""
+    # JPEG: let the decoder scale by 1/2..1/8 up front (no-op for other formats)
+    img.draft("RGB", (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    img.load()
+    # ✅ 안정화: 알파채널/팔레트/포맷 문제 방지
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if max(img.size) > MAX_IMAGE_SIDE:
+        img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), PIL.Image.Resampling.LANCZOS)
+    return img
+
+def dhash_hex(img: PIL.Image.Image) -> str:
+    """64-bit difference hash: 9x8 greyscale thumbnail, compare horizontal neighbours."""
+    # shrink first, then greyscale: the L conversion touches 72 pixels, not the frame.
+    # Other modes (16/32-bit grey PNGs, palette, CMYK...) go to L first:
+    # resize with reducing_gap isn't supported for all of them.
+    if img.mode not in ("L", "RGB", "RGBA"):
+        img = img.convert("L")
+    small = img.resize((9, 8), PIL.Image.Resampling.BILINEAR, reducing_gap=2.0).convert("L")
+    px = small.tobytes()
+    bits = 0
+    for row in range(8):
+        base = row * 9
+        for col in range(8):
+            bits = (bits << 1) | (px[base + col] > px[base + col + 1])
+    return f"{bits:016x}"
+
+def hamming_hex(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+# Compare-and-set for the dHash in one atomic step (no GET/SET race between
+# two frames of the same session). Hamming distance is counted per hex
+# nibble with plain arithmetic, so it doesn't depend on Lua's bit library.
+# KEYS: last_phash | ARGV: hash, threshold, ttl
+# Returns 1 if near-duplicate (key untouched), 0 if stored as the new reference.
+NEAR_DUP_LUA = """
+local prev = redis.call('GET', KEYS[1])
+if prev and #prev == #ARGV[1] then
+  local d = 0
+  for i = 1, #prev do
+    local a = tonumber(string.sub(prev, i, i), 16)
+    local b = tonumber(string.sub(ARGV[1], i, i), 16)
+    for _ = 1, 4 do
+      if a % 2 ~= b % 2 then d = d + 1 end
+      a = math.floor(a / 2)
+      b = math.floor(b / 2)
+    end
+  end
+  if d <= tonumber(ARGV[2]) then
+    return 1
+  end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 0
+"""
+near_dup_script = redis_client.register_script(NEAR_DUP_LUA)
+
+async def is_near_duplicate_frame(session_id: str, phash: str) -> bool:
+    """
+    Re-encoded camera frames almost never match byte-for-byte, so compare dHash
+    against the last *analyzed* frame (only updated when we go on to analyze).
+    """
     if USE_REDIS:
-        items = redis_client.lrange(k_history(session_id), 0, limit - 1)
-        return [json.loads(x) for x in items]
-    hist = analysis_history.get(session_id, [])
-    return list(reversed(hist[-limit:]))
+        hit = await near_dup_script(
+            keys=[k_last_phash(session_id)],
+            args=[phash, DEDUP_HAMMING_THRESHOLD, REDIS_TTL_SECONDS],
+        )
+        return bool(hit)
+    prev = last_phash_by_session.get(session_id)
+    if prev and hamming_hex(prev, phash) <= DEDUP_HAMMING_THRESHOLD:
+        return True
+    last_phash_by_session[session_id] = phash
+    return False
+
+# ----------------------------
+# Frame pre-check: throttle + dedup + last_call + status in ONE round-trip
+# ----------------------------
+# KEYS: last_call, last_hash, status
+# ARGV: now, frame hash, min seconds per session, ttl, status value
+FRAME_PRECHECK_LUA = """
+local now = tonumber(ARGV[1])
+local last = tonumber(redis.call('GET', KEYS[1]) or '0') or 0
+if (now - last) < tonumber(ARGV[3]) then
+  return 'THROTTLED'
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[4])
+redis.call('SET', KEYS[3], ARGV[5], 'EX', ARGV[4])
+if redis.call('GET', KEYS[2]) == ARGV[2] then
+  return 'DUPLICATE'
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[4])
+return 'OK'
+"""
+
+frame_precheck_script = redis_client.register_script(FRAME_PRECHECK_LUA)
+
+async def precheck_frame(session_id: str, fh: str) -> str:
+    """
+    Returns "ok" | "throttled" | "duplicate".
+    Redis: single atomic Lua call. In-memory: same steps via the in-memory helpers.
+    """
+    if USE_REDIS:
+        keys = session_keys(session_id)
+        code = await frame_precheck_script(
+            keys=[keys.last_call, keys.last_hash, keys.status],
+            args=[time.time(), fh, MIN_SECONDS_PER_SESSION, REDIS_TTL_SECONDS, "analyzing"],
+        )
+        return code.decode().lower()
+
+    if await should_throttle(session_id):
+        return "throttled"
+    await set_status(session_id, "analyzing")
+    await set_last_call(session_id)
+    if await is_duplicate_frame(session_id, fh):
+        return "duplicate"
+    return "ok"
 
 # ----------------------------
 # 🔒 Redis distributed lock helpers
 # ----------------------------
-def acquire_lock(session_id: str) -> bool:
+# In-memory fallback: session -> token of the request holding it, spread over
+# LOCK_STRIPES maps (hash(session_id) % LOCK_STRIPES) so sessions don't share
+# one dict. /frame only ever try-acquires, and check + insert runs without an
+# await, so no guard lock is needed. An entry exists only while held (release
+# pops it): never evicted under a holder, and the maps stay as small as the
+# number of in-flight frames.
+LOCK_STRIPES = 64
+_lock_stripes: List[Dict[str, str]] = [{} for _ in range(LOCK_STRIPES)]
+
+def _lock_stripe(session_id: str) -> Dict[str, str]:
+    return _lock_stripes[hash(session_id) % LOCK_STRIPES]
+
+# Delete the lock only if it still holds our token: if our request outlived
+# LOCK_TTL_SECONDS and someone else took the lock, leave theirs alone.
+# KEYS: lock | ARGV: token
+LOCK_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+lock_release_script = redis_client.register_script(LOCK_RELEASE_LUA)
+
+async def acquire_lock(session_id: str) -> Optional[str]:
+    """Returns an ownership token (pass it to release_lock), or None if busy."""
+    token = secrets.token_hex(16)
     if not USE_REDIS:
-        return True
-    token = str(time.time())
-    return bool(redis_client.set(k_lock(session_id), token, nx=True, ex=LOCK_TTL_SECONDS))
+        held = _lock_stripe(session_id)
+        if session_id in held:
+            return None
+        held[session_id] = token
+        return token
+    if await redis_client.set(k_lock(session_id), token, nx=True, ex=LOCK_TTL_SECONDS):
+        return token
+    return None
 
-def release_lock(session_id: str):
+async def release_lock(session_id: str, token: str):
     if USE_REDIS:
-        redis_client.delete(k_lock(session_id))
+        await lock_release_script(keys=[k_lock(session_id)], args=[token])
+        return
+    held = _lock_stripe(session_id)
+    # only our own token: a late or duplicate release can't free someone else's lock
+    if held.get(session_id) == token:
+        del held[session_id]
+
+async def finish_frame(session_id: str, token: str):
+    """status -> idle + lock release; one pipelined round-trip in Redis mode."""
+    if not USE_REDIS:
+        await set_status(session_id, "idle")
+        await release_lock(session_id, token)
+        return
+    keys = session_keys(session_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.set(keys.status, "idle", ex=REDIS_TTL_SECONDS)
+    await lock_release_script(keys=[keys.lock], args=[token], client=pipe)
+    await pipe.execute()
 
 # ----------------------------
 # Robust JSON extraction helpers
 # ----------------------------
+# Whole response is one fenced block: a single fullmatch captures the body
+_FENCED_BLOCK_RE = re.compile(r"\s*```(?:json)?\s*(.*?)\s*```\s*", re.DOTALL)
+# Otherwise (e.g. truncated, only an opening fence): drop whichever fence is there
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
 def strip_code_fences(s: str) -> str:
-    s = (s or "").strip()
-    if s.startswith("```json"):
-        s = s[7:]
-    elif s.startswith("```"):
-        s = s[3:]
-    if s.endswith("```"):
-        s = s[:-3]
-    return s.strip()
+    s = s or ""
+    m = _FENCED_BLOCK_RE.fullmatch(s)
+    if m:
+        return m.group(1)
+    return _CODE_FENCE_RE.sub("", s.strip())
 
 def extract_json_object(s: str) -> str:
     s = strip_code_fences(s)
@@ -309,6 +868,30 @@ def extract_json_object(s: str) -> str:
         return s.strip()
     return s[start : end + 1].strip()
 
+# ----------------------------
+# Speculative RAG prefetch
+# ----------------------------
+_QUERY_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def query_overlap(refined: str, prefetched: str) -> float:
+    """Share of the refined query's words that the prefetched query also has (0..1)."""
+    want = set(_QUERY_WORD_RE.findall((refined or "").lower()))
+    if not want:
+        return 0.0
+    have = set(_QUERY_WORD_RE.findall((prefetched or "").lower()))
+    return len(want & have) / len(want)
+
+def start_rag_prefetch(query: str) -> Optional["asyncio.Future[list]"]:
+    """Run rag_retrieve(query) in a worker thread now; the caller may await it or drop it."""
+    if not RAG_ENABLED or not query:
+        return None
+    # run_in_executor submits immediately (a to_thread task would only start at the
+    # next loop iteration, i.e. after whatever the caller does next)
+    fut = asyncio.get_running_loop().run_in_executor(None, rag_retrieve, query, 6)
+    # dropped prefetch: retrieve the outcome so a failure isn't reported as "never retrieved"
+    fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+    return fut
+
 # ----------------------------
 # RAG citation normalize
 # ----------------------------
@@ -316,6 +899,12 @@ def normalize_passages(passages: Any) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
     if passages is None:
         return out
+    if isinstance(passages, list) and passages and isinstance(passages[0], dict) and "text" in passages[0] and "source" in passages[0]:
+        # rag_index.Passage: known keys, no per-field fallback chain
+        return [
+            {"rank": i, "score": p.get("score"), "text": p["text"], "source": p["source"]}
+            for i, p in enumerate(passages[:6], start=1)
+        ]
     if isinstance(passages, list) and (len(passages) == 0 or isinstance(passages[0], str)):
         for i, t in enumerate(passages[:6], start=1):
             out.append({"rank": i, "score": None, "text": t, "source": "docs"})
@@ -329,6 +918,23 @@ def normalize_passages(passages: Any) -> List[Dict[str, Any]]:
         return out
     return [{"rank": 1, "score": None, "text": str(passages), "source": "docs"}]
 
+def passage_score_stats(docs: List[Dict[str, Any]]) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    """(avg, min, max) of the non-None scores in one pass; all None when nothing is scored."""
+    n = 0
+    total = 0.0
+    lo = hi = None
+    for d in docs:
+        sc = d.get("score")
+        if sc is None:
+            continue
+        n += 1
+        total += sc
+        if lo is None or sc < lo:
+            lo = sc
+        if hi is None or sc > hi:
+            hi = sc
+    return (total / n if n else None), lo, hi
+
 # ============================================================
 # ✅ ElevenLabs helper: bytes + base64 packaging
 # ============================================================
@@ -419,17 +1025,20 @@ class NoteIn(BaseModel):
     source: str | None = "web_speech"
 
 def k_notes(session_id: str) -> str:
-    return f"session:{session_id}:notes"
+    return session_keys(session_id).notes
 
 @app.post("/note")
-def add_note(payload: NoteIn):
+async def add_note(payload: NoteIn):
     ts = int(time.time() * 1000)
     item = {"ts": ts, "text": payload.text, "source": payload.source}
 
     if USE_REDIS:
-        redis_client.rpush(k_notes(payload.session_id), json.dumps(item))
-        redis_client.ltrim(k_notes(payload.session_id), -20, -1)
-        redis_client.expire(k_notes(payload.session_id), REDIS_TTL_SECONDS)
+        key = k_notes(payload.session_id)
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.rpush(key, orjson.dumps(item))
+        pipe.ltrim(key, -20, -1)
+        pipe.expire(key, REDIS_TTL_SECONDS)
+        await pipe.execute()
     else:
         notes_by_session.setdefault(payload.session_id, []).append(item)
         notes_by_session[payload.session_id] = notes_by_session[payload.session_id][-20:]
@@ -437,12 +1046,12 @@ def add_note(payload: NoteIn):
     return {"success": True, "session_id": payload.session_id, "saved": item}
 
 @app.get("/note/latest")
-def get_latest_note(session_id: str):
+async def get_latest_note(session_id: str):
     if USE_REDIS:
-        raw = redis_client.lrange(k_notes(session_id), -1, -1)
+        raw = await redis_client.lrange(k_notes(session_id), -1, -1)
         if not raw:
             return {"success": True, "session_id": session_id, "note": None}
-        return {"success": True, "session_id": session_id, "note": json.loads(raw[0])}
+        return {"success": True, "session_id": session_id, "note": orjson.loads(raw[0])}
 
     arr = notes_by_session.get(session_id, [])
     return {"success": True, "session_id": session_id, "note": (arr[-1] if arr else None)}
@@ -471,6 +1080,29 @@ class ProspectedIssue(BaseModel):
     symptoms_match: list[str]
     category: str
 
+class QuickStepsReply(BaseModel):
+    """Raw LLM reply: loose shapes (scalar/None/non-str items) are cleaned during validate_json."""
+    steps: list[str] = Field(default_factory=list)
+    safety_notes: list[str] = Field(default_factory=list)
+    when_to_call_pro: list[str] = Field(default_factory=list)
+    next_photo_request: str | None = None
+
+    @field_validator("steps", "safety_notes", "when_to_call_pro", mode="before")
+    @classmethod
+    def _as_str_list(cls, v: Any) -> list[str]:
+        if not v:
+            return []
+        if not isinstance(v, list):
+            v = [v]
+        return [t for t in (str(x).strip() for x in v if x is not None) if t]
+
+    @field_validator("next_photo_request", mode="before")
+    @classmethod
+    def _blank_is_none(cls, v: Any) -> Optional[str]:
+        return (str(v).strip() or None) if v else None
+
+QUICK_STEPS_REPLY_ADAPTER: TypeAdapter[QuickStepsReply] = TypeAdapter(QuickStepsReply)
+
 class HomeIssueExtraction(BaseModel):
     fixture_type: FixtureType
     fixture_type_confidence: float = Field(ge=0.0, le=1.0)
@@ -488,25 +1120,18 @@ class HomeIssueExtraction(BaseModel):
     water_present: bool
     immediate_action: str
     professional_needed: bool
+    # fused quick-steps plan (non-toilet only): saves the second LLM call in /frame
+    quick_plan: Optional[QuickStepsReply] = None
 
-def build_extraction_prompt(user_speech: str = "") -> str:
-    user_context = ""
-    if user_speech and user_speech.strip():
-        user_context = f"""
-USER'S SPOKEN CONTEXT (from microphone):
-"{user_speech.strip()}"
+# Built once; /frame validates every Gemini response through this
+EXTRACTION_ADAPTER: TypeAdapter[HomeIssueExtraction] = TypeAdapter(HomeIssueExtraction)
 
-Use this context to understand symptoms/questions mentioned by the user.
-"""
-
-    return f"""
+_EXTRACTION_PROMPT_HEAD = """
 You are FixDad: a cautious home repair expert (friendly dad tone).
 Analyze ONE image of a household situation.
+""".lstrip()
 
-{user_context}
-
-
-
+_EXTRACTION_PROMPT_BODY = """
 TOILET STEP SIGNALS (very important):
 - If you clearly see the toilet seat / lid, set:
   visual_flags.toilet_seat_visible=true
@@ -542,10 +1167,10 @@ IMPORTANT RULES:
 
 Return ONLY valid JSON matching this exact schema (no markdown, no commentary):
 
-{{
+{
   "fixture_type": "toilet|sink|shower|bathtub|floor_drain|pipe|water_heater|hvac|breaker_panel|appliance|unknown",
   "fixture_type_confidence": 0.0,
-  "visual_flags": {{
+  "visual_flags": {
     "human_visible": true|false,
     "human_interacting": true|false,
     "tissue_visible": true|false,
@@ -556,14 +1181,14 @@ Return ONLY valid JSON matching this exact schema (no markdown, no commentary):
     "corrosion_rust_visible": true|false,
     "smoke_fire_visible": true|false,
     "toilet_tank_lid_off": true|false
-  }},
+  },
   "no_issue_detected": true|false,
   "human_detected": true|false,
   "repair_pending": true|false,
   "prospected_issues": [
-    {{"rank": 1, "issue_name": "...", "suspected_cause": "...", "confidence": 0.0, "symptoms_match": ["..."], "category": "plumbing"}},
-    {{"rank": 2, "issue_name": "...", "suspected_cause": "...", "confidence": 0.0, "symptoms_match": ["..."], "category": "plumbing"}},
-    {{"rank": 3, "issue_name": "...", "suspected_cause": "...", "confidence": 0.0, "symptoms_match": ["..."], "category": "plumbing"}}
+    {"rank": 1, "issue_name": "...", "suspected_cause": "...", "confidence": 0.0, "symptoms_match": ["..."], "category": "plumbing"},
+    {"rank": 2, "issue_name": "...", "suspected_cause": "...", "confidence": 0.0, "symptoms_match": ["..."], "category": "plumbing"},
+    {"rank": 3, "issue_name": "...", "suspected_cause": "...", "confidence": 0.0, "symptoms_match": ["..."], "category": "plumbing"}
   ],
   "overall_danger_level": "low|medium|high",
   "location": "...",
@@ -572,8 +1197,21 @@ Return ONLY valid JSON matching this exact schema (no markdown, no commentary):
   "requires_shutoff": true|false,
   "water_present": true|false,
   "immediate_action": "...",
-  "professional_needed": true|false
-}}
+  "professional_needed": true|false,
+  "quick_plan": null | {
+    "steps": ["...", "...", "...", "..."],
+    "safety_notes": ["...", "..."],
+    "when_to_call_pro": ["...", "..."],
+    "next_photo_request": "..." | null
+  }
+}
+
+QUICK PLAN:
+- If fixture_type == "toilet": quick_plan must be null.
+- Otherwise fill quick_plan with a short, safe, actionable plan for the top issue: exactly 4 steps.
+- No dangerous instructions (no opening gas lines, no electrical panel work beyond flipping a breaker, no chemical drain cleaners).
+- If uncertain, make one step a specific next check and set next_photo_request (e.g., "show the valve").
+- Do NOT invent brand/model part numbers.
 
 STRICT:
 - Output ONLY the JSON object.
@@ -593,13 +1231,34 @@ SPECIAL:
   - Set human_detected=true and repair_pending=true
 """.strip()
 
+# Built once at import: the common no-speech case reuses this exact string.
+EXTRACTION_PROMPT: Final[str] = _EXTRACTION_PROMPT_HEAD + "\n" + _EXTRACTION_PROMPT_BODY
+
+# Speech variant: only the quoted text changes per request
+_USER_CONTEXT_PREFIX: Final[str] = (
+    _EXTRACTION_PROMPT_HEAD
+    + "\nUSER'S SPOKEN CONTEXT (from microphone):\n\""
+)
+_USER_CONTEXT_SUFFIX: Final[str] = (
+    "\"\n\nUse this context to understand symptoms/questions mentioned by the user.\n\n"
+    + _EXTRACTION_PROMPT_BODY
+)
+
+def build_extraction_prompt(user_speech: str = "") -> str:
+    speech = (user_speech or "").strip()
+    if not speech:
+        return EXTRACTION_PROMPT
+    return _USER_CONTEXT_PREFIX + speech + _USER_CONTEXT_SUFFIX
+
 # ============================================================
 # ✅ 2) Toilet demo: Guide skeleton (고정)
 # ============================================================
 
 GuideOutcome = Literal["done", "still", "flushed_again", "reset", "danger", "skip"]
 
-class GuideStep(BaseModel):
+# static records built once at import (never validated) -> frozen slots dataclass, not BaseModel
+@dataclass(frozen=True, slots=True)
+class GuideStep:
     step_id: int
     title: str
     instruction: str
@@ -632,6 +1291,9 @@ class GuideState(BaseModel):
     focus: GuideFocus = Field(default_factory=GuideFocus)
     interrupt: GuideInterrupt = Field(default_factory=GuideInterrupt)
 
+# Built once; load/save reuse the compiled core validator/serializer
+GUIDE_STATE_ADAPTER: TypeAdapter[GuideState] = TypeAdapter(GuideState)
+
 TOILET_CLOG_PLAN_ID = "toilet_clog_v1"
 
 TOILET_CLOG_STEPS: list[GuideStep] = [
@@ -679,6 +1341,8 @@ TOILET_CLOG_STEPS: list[GuideStep] = [
 
 
 GUIDE_PLANS: dict[str, list[GuideStep]] = {TOILET_CLOG_PLAN_ID: TOILET_CLOG_STEPS}
+# plans are fixed at import: step counts never change
+PLAN_TOTAL_STEPS: dict[str, int] = {pid: len(steps) for pid, steps in GUIDE_PLANS.items()}
 
 def extract_focus_from_analysis(analysis: dict) -> GuideFocus:
     issues = analysis.get("prospected_issues", []) or []
@@ -695,24 +1359,143 @@ def is_danger_escalation(analysis: dict) -> bool:
     requires = bool(analysis.get("requires_shutoff", False))
     return lvl == "high" or requires
 
-def load_guide_state(session_id: str) -> Optional[GuideState]:
-    if USE_REDIS:
-        raw = redis_client.get(k_guide_state(session_id))
-        if not raw:
-            return None
-        return GuideState.model_validate_json(raw)
-    raw = guide_state_by_session.get(session_id)
-    return GuideState.model_validate(raw) if raw else None
+# Write-through cache of the serialized state (bytes, so every load still gets a fresh model).
+# Only on when this is the sole worker (see GUIDE_STATE_CACHE_TTL_SECONDS), so every
+# guide write goes through this process and the cache can't be stale.
+guide_state_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=SESSION_CACHE_MAX, ttl=GUIDE_STATE_CACHE_TTL_SECONDS)
+    if GUIDE_STATE_CACHE_TTL_SECONDS > 0 else None
+)
 
-def save_guide_state(session_id: str, st: GuideState):
+async def load_guide_state(session_id: str) -> Optional[GuideState]:
     if USE_REDIS:
-        redis_client.set(k_guide_state(session_id), st.model_dump_json(), ex=REDIS_TTL_SECONDS)
+        raw = guide_state_cache.get(session_id) if guide_state_cache is not None else None
+        if raw is None:
+            raw = await redis_client.get(k_guide_state(session_id))
+            if not raw:
+                return None
+            if guide_state_cache is not None:
+                guide_state_cache[session_id] = raw
+        return GUIDE_STATE_ADAPTER.validate_json(raw)
+    return guide_state_by_session.get(session_id)
+
+async def load_guide_init_bundle(session_id: str) -> Tuple[Optional[dict], Optional[GuideState]]:
+    """(latest analysis item, guide state) for guide_init: one MGET instead of two GETs."""
+    if not USE_REDIS:
+        return latest_by_session.get(session_id), guide_state_by_session.get(session_id)
+    raw_state = guide_state_cache.get(session_id) if guide_state_cache is not None else None
+    if raw_state is not None:
+        raw_latest = await redis_client.get(k_latest(session_id))
     else:
-        guide_state_by_session[session_id] = st.model_dump()
+        raw_latest, raw_state = await redis_client.mget(k_latest(session_id), k_guide_state(session_id))
+        if raw_state and guide_state_cache is not None:
+            guide_state_cache[session_id] = raw_state
+    latest_item = orjson.loads(raw_latest) if raw_latest else None
+    st = GUIDE_STATE_ADAPTER.validate_json(raw_state) if raw_state else None
+    return latest_item, st
+
+# Latest background guide-state SET per session. Each one waits for the previous,
+# and inline saves / reset wait for it, so an older state can't land last.
+_pending_guide_writes: Dict[str, asyncio.Task] = {}
+
+async def flush_guide_writes(session_id: str):
+    task = _pending_guide_writes.get(session_id)
+    if task is not None and not task.done():
+        await asyncio.wait([task])  # its failure is logged by _on_write_done
+
+async def save_guide_state(session_id: str, st: GuideState, pipe=None) -> Optional[bytes]:
+    """
+    pipe: queue the SET on the caller's Redis pipeline (caller executes) instead of sending it now.
+    Returns the JSON it stored (None in memory mode) so the response can reuse it.
+    """
+    if USE_REDIS:
+        await flush_guide_writes(session_id)
+        raw = GUIDE_STATE_ADAPTER.dump_json(st)
+        if pipe is not None:
+            pipe.set(k_guide_state(session_id), raw, ex=REDIS_TTL_GUIDE_SECONDS)
+        else:
+            await redis_client.set(k_guide_state(session_id), raw, ex=REDIS_TTL_GUIDE_SECONDS)
+        if guide_state_cache is not None:
+            guide_state_cache[session_id] = raw
+        return raw
+    guide_state_by_session[session_id] = st
+    return None
+
+async def save_guide_state_background(session_id: str, st: GuideState) -> Optional[bytes]:
+    """
+    Like save_guide_state, but the Redis SET doesn't hold up the response.
+    The serialized state goes into guide_state_cache first, so the next load in
+    this process already sees it. Without that cache (or Redis) save inline.
+    """
+    if not USE_REDIS or guide_state_cache is None:
+        return await save_guide_state(session_id, st)
+    raw = GUIDE_STATE_ADAPTER.dump_json(st)  # snapshot now: later mutations of st don't leak in
+    guide_state_cache[session_id] = raw
+
+    prev = _pending_guide_writes.get(session_id)
+
+    async def write():
+        if prev is not None and not prev.done():
+            await asyncio.wait([prev])
+        await redis_client.set(k_guide_state(session_id), raw, ex=REDIS_TTL_GUIDE_SECONDS)
+
+    task = await background_write(write(), label="guide_state save")
+    if task is not None:
+        _pending_guide_writes[session_id] = task
+        task.add_done_callback(
+            lambda t: _pending_guide_writes.pop(session_id, None) if _pending_guide_writes.get(session_id) is t else None
+        )
+    return raw
 
 def get_plan_steps(plan_id: str) -> list[GuideStep]:
     return GUIDE_PLANS.get(plan_id, TOILET_CLOG_STEPS)
 
+# Steps are frozen + plans fixed at import: dump each once, reuse the dicts in every response
+@lru_cache(maxsize=64)
+def step_dump(step: GuideStep) -> dict:
+    return asdict(step)
+
+@lru_cache(maxsize=8)
+def plan_steps_dump(plan_id: str) -> Tuple[dict, ...]:
+    return tuple(step_dump(s) for s in get_plan_steps(plan_id))
+
+@lru_cache(maxsize=8)
+def plan_steps_json(plan_id: str) -> bytes:
+    return orjson.dumps(plan_steps_dump(plan_id))
+
+def guide_json_response(body: dict, st: GuideState, state_json: Optional[bytes] = None) -> Response:
+    """
+    body + "state" and the plan's pre-encoded "steps" array spliced in as raw bytes.
+    state_json: the bytes save_guide_state* just wrote, so the state is serialized once
+    per request (straight to JSON by pydantic-core, no model_dump dict in between).
+    """
+    if state_json is None:
+        state_json = GUIDE_STATE_ADAPTER.dump_json(st)
+    return Response(
+        orjson.dumps(body)[:-1] + b',"state":' + state_json + b',"steps":' + plan_steps_json(st.plan_id) + b"}",
+        media_type="application/json",
+    )
+
+def guide_step_response(
+    session_id: str,
+    st: GuideState,
+    message: str,
+    state_json: Optional[bytes] = None,
+    include_current: bool = True,
+) -> Response:
+    """The /guide/next reply every outcome shares: state, the step to show now, plan steps, message."""
+    cur = current_step_obj(st.plan_id, st) if include_current else None
+    return guide_json_response({
+        "success": True,
+        "session_id": session_id,
+        "plan_id": st.plan_id,
+        "current_step_obj": step_dump(cur) if cur else None,
+        "message": message,
+    }, st, state_json)
+
+def plan_total_steps(plan_id: str) -> int:
+    return PLAN_TOTAL_STEPS.get(plan_id, PLAN_TOTAL_STEPS[TOILET_CLOG_PLAN_ID])
+
 def clamp_step(step: int, max_step: int) -> int:
     if step < 1:
         return 1
@@ -722,7 +1505,7 @@ def clamp_step(step: int, max_step: int) -> int:
 
 def current_step_obj(plan_id: str, state: GuideState) -> Optional[GuideStep]:
     steps = get_plan_steps(plan_id)
-    idx = clamp_step(state.current_step, len(steps)) - 1
+    idx = clamp_step(state.current_step, plan_total_steps(plan_id)) - 1
     if 0 <= idx < len(steps):
         return steps[idx]
     return None
@@ -731,8 +1514,9 @@ def make_guide_overlay_payload(st: Optional[GuideState]) -> Optional[dict]:
     if not st or not st.active:
         return None
 
-    steps = get_plan_steps(st.plan_id)
+    total_steps = plan_total_steps(st.plan_id)
     cur = current_step_obj(st.plan_id, st)
+    focus = st.focus.model_dump()
 
     if st.interrupt and st.interrupt.active:
         return {
@@ -742,10 +1526,10 @@ def make_guide_overlay_payload(st: Optional[GuideState]) -> Optional[dict]:
             "message": st.interrupt.message,
             "requires_shutoff": st.interrupt.requires_shutoff,
             "plan_id": st.plan_id,
-            "focus": st.focus.model_dump(),
+            "focus": focus,
             "status": st.status,
             "current_step": st.current_step,
-            "total_steps": len(steps),
+            "total_steps": total_steps,
         }
 
     if st.status == "done":
@@ -755,10 +1539,10 @@ def make_guide_overlay_payload(st: Optional[GuideState]) -> Optional[dict]:
             "level": "medium",
             "message": "✅ Guided Fix completed. If it still doesn't work, escalate to maintenance/plumber.",
             "plan_id": st.plan_id,
-            "focus": st.focus.model_dump(),
+            "focus": focus,
             "status": st.status,
             "current_step": st.current_step,
-            "total_steps": len(steps),
+            "total_steps": total_steps,
         }
 
     return {
@@ -770,10 +1554,10 @@ def make_guide_overlay_payload(st: Optional[GuideState]) -> Optional[dict]:
         "safety_note": (cur.safety_note if cur else None),
         "check_hint": (cur.check_hint if cur else None),
         "plan_id": st.plan_id,
-        "focus": st.focus.model_dump(),
+        "focus": focus,
         "status": st.status,
         "current_step": st.current_step,
-        "total_steps": len(steps),
+        "total_steps": total_steps,
     }
 
 # ============================================================
@@ -812,8 +1596,8 @@ Context you must use:
 - fixture label: {fixture}
 - location: {location}
 - danger: {danger}
-- visual_flags: {json.dumps(flags, ensure_ascii=False)}
-- observed_symptoms: {json.dumps(observed, ensure_ascii=False)}
+- visual_flags: {_dumps(flags)}
+- observed_symptoms: {_dumps(observed)}
 {user_ctx}
 
 Constraints:
@@ -830,25 +1614,23 @@ Return ONLY valid JSON:
 }}
 
 ANALYSIS_JSON:
-{json.dumps(analysis, ensure_ascii=False, indent=2)}
+{_dumps(analysis, indent=True)}
 """.strip()
 
 async def generate_quick_steps(analysis: dict, user_speech: str = "") -> QuickStepsResponse:
     prompt = build_quick_steps_prompt(analysis, user_speech=user_speech)
 
-    resp = await asyncio.wait_for(
-        asyncio.to_thread(model.generate_content, [prompt]),
+    resp_text = await asyncio.wait_for(
+        gemini_generate_text([prompt], json_mode=True),
         timeout=REQUEST_TIMEOUT_SECONDS,
     )
 
-    raw_text = extract_json_object((resp.text or "").strip())
-    obj = json.loads(raw_text)
+    raw_text = extract_json_object(resp_text.strip())
+    reply = QUICK_STEPS_REPLY_ADAPTER.validate_json(raw_text)
 
-    steps = obj.get("steps") or []
-    safety = obj.get("safety_notes") or []
-    callpro = obj.get("when_to_call_pro") or []
-    next_req = (obj.get("next_photo_request") or "").strip() or None
+    return quick_steps_from_reply(analysis, reply)
 
+def quick_steps_from_reply(analysis: dict, reply: QuickStepsReply) -> QuickStepsResponse:
     # ✅ fixture별 “개인화된” fallback_photo
     ft = str(analysis.get("fixture_type", "unknown")).lower()
     loc = str(analysis.get("location", "") or "")
@@ -860,81 +1642,94 @@ async def generate_quick_steps(analysis: dict, user_speech: str = "") -> QuickSt
     else:
         fallback_photo = f"Take one clear wide photo of the {fixture or ft} and the surrounding area (location: {loc})."
 
-    steps4 = _ensure_four_steps(steps, fallback_photo=fallback_photo)
-
-    # 안전/콜프로도 리스트 형태 보정
-    if not isinstance(safety, list): safety = [str(safety)]
-    if not isinstance(callpro, list): callpro = [str(callpro)]
+    steps4 = _ensure_four_steps(reply.steps, fallback_photo=fallback_photo)
 
     return QuickStepsResponse(
         fixture_type=str(analysis.get("fixture_type", "unknown")),
         steps=steps4,
-        safety_notes=[str(x).strip() for x in safety if str(x).strip()][:6],
-        when_to_call_pro=[str(x).strip() for x in callpro if str(x).strip()][:6],
-        next_photo_request=next_req,
+        safety_notes=reply.safety_notes[:6],
+        when_to_call_pro=reply.when_to_call_pro[:6],
+        next_photo_request=reply.next_photo_request,
     )
 
 # ============================================================
 # ✅ 4) Toilet demo: server 강제 override
 # ============================================================
 
+_BROWN_TISSUE_SYMPTOM: Final[str] = "brown tissue visible"
+
+# Top-level fields forced for a brown-tissue toilet frame, by water_near_rim (read-only views)
+_TOILET_NEAR_RIM_OVERRIDES: Final[Mapping[str, Any]] = MappingProxyType({
+    "no_issue_detected": False,
+    "water_present": True,
+    "overall_danger_level": "medium",
+    "requires_shutoff": True,
+    "professional_needed": False,
+    "immediate_action": "Stop flushing. Watch water level. Be ready to shut off the toilet supply valve if it rises.",
+})
+_TOILET_CLOG_OVERRIDES: Final[Mapping[str, Any]] = MappingProxyType({
+    "no_issue_detected": False,
+    "water_present": True,
+    "overall_danger_level": "low",
+    "requires_shutoff": False,
+    "professional_needed": False,
+    "immediate_action": "Stop flushing. Prepare a flange plunger and try plunging.",
+})
+
+# Fallback 3-issue skeleton when the model didn't return exactly 3 (built once at import)
+_DEFAULT_TOILET_ISSUES: Final[Tuple[dict, ...]] = (
+    {
+        "rank": 1,
+        "issue_name": "Toilet clogged (paper blockage)",
+        "suspected_cause": "Paper/tissue buildup blocking the trap",
+        "confidence": 0.9,
+        "symptoms_match": (_BROWN_TISSUE_SYMPTOM, "likely paper blockage"),
+        "category": "plumbing",
+    },
+    {
+        "rank": 2,
+        "issue_name": "Partial toilet clog",
+        "suspected_cause": "Partial blockage in the trapway",
+        "confidence": 0.6,
+        "symptoms_match": ("tissue visible",),
+        "category": "plumbing",
+    },
+    {
+        "rank": 3,
+        "issue_name": "Low flush / weak siphon",
+        "suspected_cause": "Weak flush may fail to clear solids",
+        "confidence": 0.35,
+        "symptoms_match": ("toilet bowl contents not clearing",),
+        "category": "plumbing",
+    },
+)
+
 def apply_toilet_demo_overrides(parsed_dict: dict) -> dict:
     try:
         ft = str(parsed_dict.get("fixture_type", "unknown"))
         flags = parsed_dict.get("visual_flags") or {}
         brown = bool(flags.get("brown_tissue_visible", False))
         if ft == "toilet" and brown:
-            parsed_dict["no_issue_detected"] = False
-            parsed_dict["water_present"] = True
-
-            if bool(flags.get("water_near_rim", False)):
-                parsed_dict["overall_danger_level"] = "medium"
-                parsed_dict["requires_shutoff"] = True
-                parsed_dict["professional_needed"] = False
-                parsed_dict["immediate_action"] = "Stop flushing. Watch water level. Be ready to shut off the toilet supply valve if it rises."
-            else:
-                parsed_dict["overall_danger_level"] = "low"
-                parsed_dict["requires_shutoff"] = False
-                parsed_dict["professional_needed"] = False
-                parsed_dict["immediate_action"] = "Stop flushing. Prepare a flange plunger and try plunging."
+            parsed_dict.update(
+                _TOILET_NEAR_RIM_OVERRIDES if flags.get("water_near_rim") else _TOILET_CLOG_OVERRIDES
+            )
 
             issues = parsed_dict.get("prospected_issues") or []
             if len(issues) != 3:
-                issues = [
-                    {
-                        "rank": 1,
-                        "issue_name": "Toilet clogged (paper blockage)",
-                        "suspected_cause": "Paper/tissue buildup blocking the trap",
-                        "confidence": 0.9,
-                        "symptoms_match": ["brown tissue visible", "likely paper blockage"],
-                        "category": "plumbing",
-                    },
-                    {
-                        "rank": 2,
-                        "issue_name": "Partial toilet clog",
-                        "suspected_cause": "Partial blockage in the trapway",
-                        "confidence": 0.6,
-                        "symptoms_match": ["tissue visible"],
-                        "category": "plumbing",
-                    },
-                    {
-                        "rank": 3,
-                        "issue_name": "Low flush / weak siphon",
-                        "suspected_cause": "Weak flush may fail to clear solids",
-                        "confidence": 0.35,
-                        "symptoms_match": ["toilet bowl contents not clearing"],
-                        "category": "plumbing",
-                    },
-                ]
+                # fresh dicts/lists per call: the result is stored and may be mutated later
+                issues = [{**x, "symptoms_match": list(x["symptoms_match"])} for x in _DEFAULT_TOILET_ISSUES]
             else:
-                issues[0]["issue_name"] = "Toilet clogged (paper blockage)"
-                issues[0]["suspected_cause"] = "Paper/tissue buildup blocking the trap"
-                issues[0]["confidence"] = max(float(issues[0].get("confidence", 0.0)), 0.9)
-                sm = issues[0].get("symptoms_match") or []
-                if "brown tissue visible" not in sm:
-                    sm.append("brown tissue visible")
-                issues[0]["symptoms_match"] = sm
-                issues[0]["category"] = issues[0].get("category") or "plumbing"
+                top = issues[0]
+                top["issue_name"] = "Toilet clogged (paper blockage)"
+                top["suspected_cause"] = "Paper/tissue buildup blocking the trap"
+                top["confidence"] = max(float(top.get("confidence", 0.0)), 0.9)
+                # validated list (≤ a handful of items): one scan, append in place, no set build
+                sm = top.get("symptoms_match")
+                if not sm:
+                    top["symptoms_match"] = [_BROWN_TISSUE_SYMPTOM]
+                elif _BROWN_TISSUE_SYMPTOM not in sm:
+                    sm.append(_BROWN_TISSUE_SYMPTOM)
+                top["category"] = top.get("category") or "plumbing"
             parsed_dict["prospected_issues"] = issues
     except Exception:
         pass
@@ -1021,10 +1816,10 @@ def build_rag_query_general(analysis: dict) -> str:
 # ✅ 6) Groq solution generators (pipe + generic)
 # ============================================================
 
-def _groq_chat(system: str, user: str) -> str:
+async def _groq_chat(system: str, user: str) -> str:
     if not groq_client:
         raise RuntimeError("Groq not configured. Set GROQ_API_KEY and pip install groq.")
-    resp = groq_client.chat.completions.create(
+    resp = await groq_client.chat.completions.create(
         model=GROQ_MODEL,
         messages=[
             {"role": "system", "content": system},
@@ -1035,7 +1830,7 @@ def _groq_chat(system: str, user: str) -> str:
     )
     return (resp.choices[0].message.content or "").strip()
 
-def build_pipe_solution_prompt(analysis: dict, citations: list[dict]) -> Tuple[str, str]:
+def build_pipe_solution_prompt(analysis: dict, citations: list[dict], analysis_json: Optional[str] = None) -> Tuple[str, str]:
     system = (
         "You are FixDad, a cautious home repair assistant. "
         "If this is a pipe leak/broken pipe, prioritize: shutoff, containment, and safe escalation. "
@@ -1047,10 +1842,10 @@ TASK:
 Generate a safe, step-by-step fix plan for a PIPE issue (leak/burst/broken/corroded).
 
 ANALYSIS_JSON:
-{json.dumps(analysis, ensure_ascii=False, indent=2)}
+{analysis_json or _dumps(analysis, indent=True)}
 
 RETRIEVED_EXCERPTS (may be empty):
-{json.dumps(citations, ensure_ascii=False, indent=2)}
+{_dumps(citations, indent=True)}
 
 OUTPUT FORMAT (plain text, exact headings):
 1) What I think is happening
@@ -1086,7 +1881,7 @@ def _ensure_four_steps(steps: Any, fallback_photo: str) -> list[str]:
             cleaned.append(f"{i}) Do the next safe check based on what you see, then re-capture a clear photo.")
     return cleaned[:4]
 
-def build_generic_solution_prompt(analysis: dict, citations: list[dict]) -> Tuple[str, str]:
+def build_generic_solution_prompt(analysis: dict, citations: list[dict], analysis_json: Optional[str] = None) -> Tuple[str, str]:
     system = (
         "You are FixDad, a cautious home repair assistant. "
         "Tailor the plan to the detected fixture_type and top issue. "
@@ -1097,10 +1892,10 @@ TASK:
 Generate a safe, step-by-step fix plan that matches the detected fixture/issue.
 
 ANALYSIS_JSON:
-{json.dumps(analysis, ensure_ascii=False, indent=2)}
+{analysis_json or _dumps(analysis, indent=True)}
 
 RETRIEVED_EXCERPTS (may be empty):
-{json.dumps(citations, ensure_ascii=False, indent=2)}
+{_dumps(citations, indent=True)}
 
 OUTPUT FORMAT:
 1) What I think is happening
@@ -1112,48 +1907,63 @@ OUTPUT FORMAT:
 """.strip()
     return system, user
 
-async def groq_solution_text_for_pipe(analysis: dict) -> Tuple[str, list[dict], str]:
+async def groq_solution_text_for_pipe(analysis: dict, analysis_json: Optional[str] = None) -> Tuple[str, list[dict], str]:
     query = build_rag_query_general(analysis)
-    passages_raw = rag_retrieve(query, top_k=6) if RAG_ENABLED else []
+    # FAISS search + query embedding is CPU-bound: keep it off the event loop
+    passages_raw = await asyncio.to_thread(rag_retrieve, query, 6) if RAG_ENABLED else []
     citations = normalize_passages(passages_raw)
 
-    system, user = build_pipe_solution_prompt(analysis, citations)
-    text = await asyncio.to_thread(_groq_chat, system, user)
+    system, user = build_pipe_solution_prompt(analysis, citations, analysis_json)
+    text = await _groq_chat(system, user)
     return text, citations, query
 
-async def groq_solution_text_generic(analysis: dict) -> Tuple[str, list[dict], str]:
+async def groq_solution_text_generic(analysis: dict, analysis_json: Optional[str] = None) -> Tuple[str, list[dict], str]:
     query = build_rag_query_general(analysis)
-    passages_raw = rag_retrieve(query, top_k=6) if RAG_ENABLED else []
+    # FAISS search + query embedding is CPU-bound: keep it off the event loop
+    passages_raw = await asyncio.to_thread(rag_retrieve, query, 6) if RAG_ENABLED else []
     citations = normalize_passages(passages_raw)
 
-    system, user = build_generic_solution_prompt(analysis, citations)
-    text = await asyncio.to_thread(_groq_chat, system, user)
+    system, user = build_generic_solution_prompt(analysis, citations, analysis_json)
+    text = await _groq_chat(system, user)
     return text, citations, query
 
 # ============================================================
 # Debug endpoints
 # ============================================================
 
+# encoded /debug/redis body; every viewer tick / socket refresh asks for it
+debug_redis_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=1, ttl=DEBUG_REDIS_CACHE_TTL_SECONDS) if DEBUG_REDIS_CACHE_TTL_SECONDS > 0 else None
+)
+
 @app.get("/debug/redis")
 async def debug_redis():
+    body = debug_redis_cache.get("body") if debug_redis_cache is not None else None
+    if body is not None:
+        return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
     if not USE_REDIS:
-        return {"use_backend": True, "use_redis": False, "error": "Redis fallback mode"}
-    return {
-        "use_backend": True,
-        "use_redis": True,
-        "redis_host": f"{REDIS_HOST}:{REDIS_PORT}",
-        "redis_db": REDIS_DB,
-        "dbsize": redis_client.dbsize(),
-        "sample_keys": redis_client.keys("session:*")[:50],
-    }
+        data = {"use_backend": True, "use_redis": False, "error": "Redis fallback mode"}
+    else:
+        data = {
+            "use_backend": True,
+            "use_redis": True,
+            "redis_host": f"{REDIS_HOST}:{REDIS_PORT}",
+            "redis_db": REDIS_DB,
+            "dbsize": await redis_client.dbsize(),
+            "sample_keys": [k.decode() for k in (await redis_client.keys("session:*"))[:50]],
+        }
+    body = orjson.dumps(data)
+    if debug_redis_cache is not None:
+        debug_redis_cache["body"] = body
+    return Response(body, media_type="application/json", headers={"X-Cache": "MISS"})
 
 @app.get("/status/{session_id}")
 async def status(session_id: str):
-    return {"success": True, "session_id": session_id, "status": get_status(session_id)}
+    return {"success": True, "session_id": session_id, "status": await get_status(session_id)}
 
 @app.get("/debug/latest_raw/{session_id}")
 async def debug_latest_raw(session_id: str):
-    item = get_latest(session_id)
+    item = await get_latest(session_id)
     if not item:
         return {"success": False, "error": "No latest", "session_id": session_id}
     return {"success": True, "session_id": session_id, "latest": item}
@@ -1161,7 +1971,7 @@ async def debug_latest_raw(session_id: str):
 @app.post("/debug/write")
 async def debug_write(session_id: str = Form("demo-session-1")):
     test_payload = {"hello": "world", "session_id": session_id}
-    store_analysis(session_id, test_payload, raw_response="debug_write")
+    await store_analysis(session_id, test_payload, raw_response="debug_write")
     return {"success": True, "wrote": True, "session_id": session_id}
 
 # ============================================================
@@ -1178,34 +1988,32 @@ async def analyze_frame(
     stt_text: str = Form(""),
     stt_ts: str = Form(""),
 ):
-    if not acquire_lock(session_id):
+    """
+    Cheapest checks first; pixels are only decoded when we're really going to
+    call Gemini: lock -> throttle + exact dedup (hash of the bytes, one Redis
+    call) -> cross-session cache -> decode -> dHash dedup -> Gemini.
+    """
+    lock_token = await acquire_lock(session_id)
+    if lock_token is None:
         return {
             "success": False,
             "skipped": True,
             "reason": "busy",
             "session_id": session_id,
-            "status": get_status(session_id),
+            "status": await get_status(session_id),
         }
 
+    qs_task: Optional["asyncio.Task[QuickStepsResponse]"] = None
     try:
-        if should_throttle(session_id):
-            return {"success": False, "skipped": True, "reason": "throttled", "session_id": session_id}
-
-        set_status(session_id, "analyzing")
-        set_last_call(session_id)
-
         raw_image = await image.read()
+        if not raw_image:
+            # don't let an empty upload consume the throttle window
+            return {"success": False, "error": "Bad image: empty upload", "session_id": session_id}
+        fh = frame_hash(raw_image)
 
-        if is_duplicate_frame(session_id, raw_image):
-            return {"success": False, "skipped": True, "reason": "duplicate", "session_id": session_id}
-
-        try:
-            pil_image = PIL.Image.open(io.BytesIO(raw_image))
-            # ✅ 안정화: 알파채널/팔레트/포맷 문제 방지
-            if pil_image.mode != "RGB":
-                pil_image = pil_image.convert("RGB")
-        except Exception as e:
-            return {"success": False, "error": f"Bad image: {repr(e)}", "session_id": session_id}
+        check = await precheck_frame(session_id, fh)
+        if check != "ok":
+            return {"success": False, "skipped": True, "reason": check, "session_id": session_id}
 
         # --- Use speech-to-text if provided, otherwise check notes ---
         user_context = (stt_text or "").strip()
@@ -1213,10 +2021,9 @@ async def analyze_frame(
         if not user_context:
             try:
                 if USE_REDIS:
-                    key = f"session:{session_id}:notes"
-                    raw = redis_client.lrange(key, -1, -1)
+                    raw = await redis_client.lrange(k_notes(session_id), -1, -1)
                     if raw:
-                        note = json.loads(raw[0])
+                        note = orjson.loads(raw[0])
                         user_context = str(note.get("text", "")).strip()
                 else:
                     arr = notes_by_session.get(session_id, [])
@@ -1225,36 +2032,67 @@ async def analyze_frame(
             except Exception:
                 pass
 
-        prompt = build_extraction_prompt(user_context)
+        # Same bytes + same spoken context seen before (any session)? Reuse it.
+        cache_key = k_frame_cache(fh, user_context)
+        cached = await get_cached_extraction(cache_key)
 
-        try:
-            # ✅ 안정화: 2파트로 단순화 (prompt + image)
-            resp = await asyncio.wait_for(
-                asyncio.to_thread(model.generate_content, [prompt, pil_image]),
-                timeout=REQUEST_TIMEOUT_SECONDS,
-            )
-        except asyncio.TimeoutError:
-            return {"success": False, "error": "Gemini timeout", "session_id": session_id}
-        except Exception as e:
-            err_full = repr(e)
-            print("🔥 GEMINI ERROR FULL:", err_full)
-            return {"success": False, "error": f"Gemini API error: {err_full}", "session_id": session_id}
+        if cached is not None:
+            del raw_image
+            parsed_dict = orjson.loads(cached)
+            raw_text = "frame_cache_hit"
+        else:
+            try:
+                image_part, phash = await asyncio.to_thread(prepare_frame, raw_image)
+            except Exception as e:
+                return {"success": False, "error": f"Bad image: {repr(e)}", "session_id": session_id}
+            del raw_image
 
-        raw_text = (resp.text or "").strip()
-        json_text = extract_json_object(raw_text)
+            if await is_near_duplicate_frame(session_id, phash):
+                return {"success": False, "skipped": True, "reason": "duplicate", "session_id": session_id}
 
-        try:
-            parsed = HomeIssueExtraction.model_validate_json(json_text)
-        except Exception as e:
-            store_analysis(session_id, {"error": "validation_failed"}, raw_response=raw_text[:4000])
-            return {
-                "success": False,
-                "error": f"JSON validation failed: {str(e)}",
-                "raw_response": raw_text[:1200],
-                "session_id": session_id,
-            }
+            prompt = build_extraction_prompt(user_context)
 
-        parsed_dict = parsed.model_dump()
+            try:
+                # ✅ 안정화: 2파트로 단순화 (prompt + image)
+                resp_text = await asyncio.wait_for(
+                    gemini_generate_text([prompt, image_part], json_mode=True),
+                    timeout=REQUEST_TIMEOUT_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                return {"success": False, "error": "Gemini timeout", "session_id": session_id}
+            except Exception as e:
+                err_full = repr(e)
+                print("🔥 GEMINI ERROR FULL:", err_full)
+                return {"success": False, "error": f"Gemini API error: {err_full}", "session_id": session_id}
+
+            raw_text = resp_text.strip()
+
+            # bare JSON object (the common case) goes straight to the validator;
+            # only fenced / chatty responses need the {...} cut out first
+            if raw_text.startswith("{") and raw_text.endswith("}"):
+                json_text = raw_text
+            else:
+                json_text = extract_json_object(raw_text)
+
+            try:
+                parsed = EXTRACTION_ADAPTER.validate_json(json_text)
+            except Exception as e:
+                await store_analysis_background(session_id, {"error": "validation_failed"}, raw_response=raw_text[:4000])
+                return {
+                    "success": False,
+                    "error": f"JSON validation failed: {str(e)}",
+                    "raw_response": raw_text[:1200],
+                    "session_id": session_id,
+                }
+
+            # Dump once, already JSON-safe: this same dict is stored, passed to the
+            # override/quick-steps helpers and returned without another coercion pass.
+            parsed_dict = parsed.model_dump(mode="json")
+            await put_cached_extraction(cache_key, orjson.dumps(parsed_dict))
+
+        # fused quick-steps plan rides along in the extraction (and its cache entry);
+        # keep it out of the stored/returned analysis
+        quick_plan = parsed_dict.pop("quick_plan", None)
 
         # (B) Toilet demo hard rule override
         parsed_dict = apply_toilet_demo_overrides(parsed_dict)
@@ -1262,16 +2100,27 @@ async def analyze_frame(
         # (B.5) Human detection categorization
         parsed_dict = categorize_with_human_detection(parsed_dict)
 
-        # Save
-        store_analysis(session_id, parsed_dict, raw_response=raw_text[:4000])
-
         fixture_type = str(parsed_dict.get("fixture_type", "unknown"))
         guide_overlay = None
         quick_steps = None
+        if fixture_type != "toilet":
+            if quick_plan and quick_plan.get("steps"):
+                try:
+                    reply = QUICK_STEPS_REPLY_ADAPTER.validate_python(quick_plan)
+                    quick_steps = quick_steps_from_reply(parsed_dict, reply).model_dump(mode="json")
+                except Exception:
+                    quick_steps = None
+            if quick_steps is None:
+                # no usable fused plan: separate quick-steps LLM call (it only reads parsed_dict),
+                # started now so the store, guide and voice work below overlap with it
+                qs_task = asyncio.create_task(generate_quick_steps(parsed_dict))
+
+        # Save
+        await store_analysis_background(session_id, parsed_dict, raw_response=raw_text[:4000])
 
         # (C) Routing: toilet -> guide overlay, else -> quick steps (for UI)
         if fixture_type == "toilet":
-            st = load_guide_state(session_id)
+            st = await load_guide_state(session_id)
             if st and st.active and st.status in ("active", "paused"):
                 if is_danger_escalation(parsed_dict):
                     lvl = str(parsed_dict.get("overall_danger_level", "high")).lower()
@@ -1294,20 +2143,8 @@ async def analyze_frame(
                             st.status = "active"
 
                 st.last_updated = time.time()
-                save_guide_state(session_id, st)
+                await save_guide_state_background(session_id, st)
                 guide_overlay = make_guide_overlay_payload(st)
-        else:
-            try:
-                qs = await generate_quick_steps(parsed_dict)
-                quick_steps = qs.model_dump()
-            except Exception as e:
-                quick_steps = {
-                    "fixture_type": fixture_type,
-                    "steps": [],
-                    "safety_notes": [],
-                    "when_to_call_pro": [],
-                    "error": f"quick_steps_failed: {repr(e)[:140]}",
-                }
 
         # Optional voice for immediate action
         want_voice = str(with_voice).lower() in ("1", "true", "yes", "y")
@@ -1325,36 +2162,70 @@ async def analyze_frame(
                 (voice_id.strip() or DEFAULT_VOICE_ID),
             )
 
-        return {
+        if qs_task is not None:
+            try:
+                qs = await qs_task
+                quick_steps = qs.model_dump(mode="json")
+            except Exception as e:
+                quick_steps = {
+                    "fixture_type": fixture_type,
+                    "steps": [],
+                    "safety_notes": [],
+                    "when_to_call_pro": [],
+                    "error": f"quick_steps_failed: {repr(e)[:140]}",
+                }
+
+        # every piece is already plain JSON (mode="json" dumps / literal dicts):
+        # hand it straight to orjson, no jsonable_encoder walk
+        return ORJSONResponse({
             "success": True,
             "session_id": session_id,
             "data": parsed_dict,
             "guide_overlay": guide_overlay,
             "quick_steps": quick_steps,
             "voice": voice,
-        }
+        })
 
     finally:
-        set_status(session_id, "idle")
-        release_lock(session_id)
+        # bailed out before awaiting it (voice error, client gone): don't leak the LLM call
+        if qs_task is not None and not qs_task.done():
+            qs_task.cancel()
+        await finish_frame(session_id, lock_token)
 
 @app.get("/latest/{session_id}")
-async def latest(session_id: str):
-    item = get_latest(session_id)
+async def latest(session_id: str, request: Request):
+    # pollers send If-None-Match: one small GET answers "unchanged" with no body
+    etag = await get_latest_etag(session_id)
+    if etag and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    item = await get_latest(session_id)
     if not item:
         return {"success": False, "error": "No latest analysis yet", "session_id": session_id}
-    return {"success": True, "session_id": session_id, "latest": item}
+    # stored entries are plain JSON already: skip jsonable_encoder
+    return ORJSONResponse(
+        {"success": True, "session_id": session_id, "latest": item},
+        headers={"ETag": etag} if etag else None,
+    )
 
 @app.get("/history/{session_id}")
-async def history(session_id: str, limit: int = 50):
-    hist = get_history(session_id, limit)
-    return {
-        "success": True,
-        "session_id": session_id,
-        "count": len(hist),
-        "history": hist,
-        "storage": "redis" if USE_REDIS else "in-memory",
-    }
+async def history(session_id: str, request: Request, limit: int = 50):
+    etag = await get_latest_etag(session_id)
+    if etag:
+        # page size is part of the representation: ?limit=5 and ?limit=50 differ
+        etag = f'{etag[:-1]}-{history_page_size(limit)}"'
+    if etag and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    hist = await get_history(session_id, limit)
+    return ORJSONResponse(
+        {
+            "success": True,
+            "session_id": session_id,
+            "count": len(hist),
+            "history": hist,
+            "storage": "redis" if USE_REDIS else "in-memory",
+        },
+        headers={"ETag": etag} if etag else None,
+    )
 
 @app.get("/health")
 async def health_check():
@@ -1386,7 +2257,7 @@ class GuideInitRequest(BaseModel):
 async def guide_init(req: GuideInitRequest):
     session_id = req.session_id
 
-    latest_item = get_latest(session_id)
+    latest_item, st = await load_guide_init_bundle(session_id)
     if not latest_item:
         return {"success": False, "error": "No analysis found. Capture a frame first.", "session_id": session_id}
 
@@ -1403,21 +2274,17 @@ async def guide_init(req: GuideInitRequest):
         return {"success": False, "error": "Guide is enabled only for toilet demo. Use quick_steps for other fixtures.", "session_id": session_id}
 
     plan_id = TOILET_CLOG_PLAN_ID
-    steps = get_plan_steps(plan_id)
 
-    st = load_guide_state(session_id)
     if st and st.plan_id == plan_id and st.status in ("active", "paused"):
         st.active = True
         st.last_updated = time.time()
-        save_guide_state(session_id, st)
-        return {
+        state_json = await save_guide_state(session_id, st)
+        return guide_json_response({
             "success": True,
             "session_id": session_id,
             "plan_id": plan_id,
-            "steps": [s.model_dump() for s in steps],
-            "state": st.model_dump(),
             "selected_reason": "existing state reused",
-        }
+        }, st, state_json)
 
     focus = extract_focus_from_analysis(analysis)
     st = GuideState(
@@ -1431,43 +2298,47 @@ async def guide_init(req: GuideInitRequest):
         interrupt=GuideInterrupt(active=False),
     )
     if USE_REDIS:
-        redis_client.set(k_guide_plan(session_id), plan_id, ex=REDIS_TTL_SECONDS)
-    save_guide_state(session_id, st)
+        # plan id + state in one round-trip
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(k_guide_plan(session_id), plan_id, ex=REDIS_TTL_GUIDE_SECONDS)
+        state_json = await save_guide_state(session_id, st, pipe=pipe)
+        await pipe.execute()
+    else:
+        state_json = await save_guide_state(session_id, st)
 
-    return {
+    return guide_json_response({
         "success": True,
         "session_id": session_id,
         "plan_id": plan_id,
-        "steps": [s.model_dump() for s in steps],
-        "state": st.model_dump(),
         "selected_reason": "toilet demo plan",
-    }
+    }, st, state_json)
 
 @app.get("/guide/state/{session_id}")
 async def guide_state(session_id: str):
-    st = load_guide_state(session_id)
+    st = await load_guide_state(session_id)
     if not st:
         return {"success": False, "error": "No guide state. Call /guide/init first.", "session_id": session_id}
 
-    steps = get_plan_steps(st.plan_id)
     cur = current_step_obj(st.plan_id, st)
     overlay = make_guide_overlay_payload(st)
-    return {
+    return guide_json_response({
         "success": True,
         "session_id": session_id,
         "plan_id": st.plan_id,
-        "steps": [s.model_dump() for s in steps],
-        "state": st.model_dump(),
-        "current_step_obj": cur.model_dump() if cur else None,
+        "current_step_obj": step_dump(cur) if cur else None,
         "guide_overlay": overlay,
-    }
+    }, st)
 
 @app.post("/guide/reset")
 async def guide_reset(req: GuideInitRequest):
     session_id = req.session_id
     if USE_REDIS:
-        redis_client.delete(k_guide_state(session_id))
-        redis_client.delete(k_guide_plan(session_id))
+        # a background save still in flight would otherwise bring the state back
+        await flush_guide_writes(session_id)
+        # one multi-key DEL instead of two round-trips
+        await redis_client.delete(k_guide_state(session_id), k_guide_plan(session_id))
+        if guide_state_cache is not None:
+            guide_state_cache.pop(session_id, None)
     else:
         guide_state_by_session.pop(session_id, None)
     return {"success": True, "session_id": session_id, "message": "Guide reset."}
@@ -1480,12 +2351,11 @@ class GuideNextRequest(BaseModel):
 @app.post("/guide/next")
 async def guide_next(req: GuideNextRequest):
     session_id = req.session_id
-    st = load_guide_state(session_id)
+    st = await load_guide_state(session_id)
     if not st:
         return {"success": False, "error": "No guide state. Call /guide/init first.", "session_id": session_id}
 
-    steps = get_plan_steps(st.plan_id)
-    max_step = len(steps)
+    max_step = plan_total_steps(st.plan_id)
 
     if req.outcome == "reset":
         st.current_step = 1
@@ -1495,32 +2365,14 @@ async def guide_next(req: GuideNextRequest):
         st.active = True
         st.interrupt = GuideInterrupt(active=False)
         st.last_updated = time.time()
-        save_guide_state(session_id, st)
-        cur = current_step_obj(st.plan_id, st)
-        return {
-            "success": True,
-            "session_id": session_id,
-            "plan_id": st.plan_id,
-            "steps": [s.model_dump() for s in steps],
-            "state": st.model_dump(),
-            "current_step_obj": cur.model_dump() if cur else None,
-            "message": "Reset to step 1.",
-        }
+        state_json = await save_guide_state_background(session_id, st)
+        return guide_step_response(session_id, st, "Reset to step 1.", state_json)
 
     if req.outcome == "danger":
         st.status = "paused"
         st.last_updated = time.time()
-        save_guide_state(session_id, st)
-        cur = current_step_obj(st.plan_id, st)
-        return {
-            "success": True,
-            "session_id": session_id,
-            "plan_id": st.plan_id,
-            "steps": [s.model_dump() for s in steps],
-            "state": st.model_dump(),
-            "current_step_obj": cur.model_dump() if cur else None,
-            "message": "Pausing: treat as high risk. Stop and escalate.",
-        }
+        state_json = await save_guide_state_background(session_id, st)
+        return guide_step_response(session_id, st, "Pausing: treat as high risk. Stop and escalate.", state_json)
 
     if st.interrupt and st.interrupt.active and req.outcome in ("done", "still", "skip", "flushed_again"):
         st.interrupt.active = False
@@ -1540,18 +2392,9 @@ async def guide_next(req: GuideNextRequest):
             msg = "All steps completed. If issue persists, escalate / call a pro."
 
         st.last_updated = time.time()
-        save_guide_state(session_id, st)
+        state_json = await save_guide_state_background(session_id, st)
 
-        cur = current_step_obj(st.plan_id, st) if st.status != "done" else None
-        return {
-            "success": True,
-            "session_id": session_id,
-            "plan_id": st.plan_id,
-            "steps": [s.model_dump() for s in steps],
-            "state": st.model_dump(),
-            "current_step_obj": cur.model_dump() if cur else None,
-            "message": msg,
-        }
+        return guide_step_response(session_id, st, msg, state_json, include_current=st.status != "done")
 
     if req.outcome == "still":
         k = str(st.current_step)
@@ -1564,48 +2407,21 @@ async def guide_next(req: GuideNextRequest):
             msg = "Got it. Try the same step once more carefully."
 
         st.last_updated = time.time()
-        save_guide_state(session_id, st)
+        state_json = await save_guide_state_background(session_id, st)
 
-        cur = current_step_obj(st.plan_id, st)
-        return {
-            "success": True,
-            "session_id": session_id,
-            "plan_id": st.plan_id,
-            "steps": [s.model_dump() for s in steps],
-            "state": st.model_dump(),
-            "current_step_obj": cur.model_dump() if cur else None,
-            "message": msg,
-        }
+        return guide_step_response(session_id, st, msg, state_json)
 
     if req.outcome == "flushed_again":
         st.current_step = 1
         st.status = "active"
         st.last_updated = time.time()
-        save_guide_state(session_id, st)
+        state_json = await save_guide_state_background(session_id, st)
 
-        cur = current_step_obj(st.plan_id, st)
-        return {
-            "success": True,
-            "session_id": session_id,
-            "plan_id": st.plan_id,
-            "steps": [s.model_dump() for s in steps],
-            "state": st.model_dump(),
-            "current_step_obj": cur.model_dump() if cur else None,
-            "message": "You flushed again. Overflow risk is higher now. Back to Step 1: stop flushing and stabilize the water level.",
-        }
+        return guide_step_response(session_id, st, "You flushed again. Overflow risk is higher now. Back to Step 1: stop flushing and stabilize the water level.", state_json)
 
     st.last_updated = time.time()
-    save_guide_state(session_id, st)
-    cur = current_step_obj(st.plan_id, st)
-    return {
-        "success": True,
-        "session_id": session_id,
-        "plan_id": st.plan_id,
-        "steps": [s.model_dump() for s in steps],
-        "state": st.model_dump(),
-        "current_step_obj": cur.model_dump() if cur else None,
-        "message": "Current step returned.",
-    }
+    state_json = await save_guide_state_background(session_id, st)
+    return guide_step_response(session_id, st, "Current step returned.", state_json)
 
 # ============================================================
 # ✅ Solution endpoint: ROUTE BY fixture_type
@@ -1617,133 +2433,328 @@ class SolutionRequest(BaseModel):
     with_voice: bool = False
     voice_id: Optional[str] = None
 
-@app.post("/solution")
-async def generate_solution(req: SolutionRequest):
-    session_id = req.session_id
-    t0_total = time.time()
-    stage_latencies = {}
-
-    latest_item = get_latest(session_id)
+async def load_solution_analysis(session_id: str) -> Tuple[Optional[dict], Optional[dict]]:
+    """(analysis, None) or (None, error response) for the session's latest frame."""
+    latest_item = await get_latest(session_id)
     if not latest_item:
-        return {"success": False, "error": "No analysis found for session", "session_id": session_id}
+        return None, {"success": False, "error": "No analysis found for session", "session_id": session_id}
 
     analysis = latest_item.get("data") if isinstance(latest_item, dict) else None
     if not analysis or not isinstance(analysis, dict):
-        return {"success": False, "error": "Latest analysis missing data", "session_id": session_id}
-
-    fixture_type = str(analysis.get("fixture_type", "unknown")).lower()
+        return None, {"success": False, "error": "Latest analysis missing data", "session_id": session_id}
+    return analysis, None
 
-    async def _attach_voice(resp_dict: dict, spoken_text: str):
-        if not req.with_voice:
-            return resp_dict
-        voice = await asyncio.to_thread(
-            voice_payload_from_text,
-            spoken_text[:450],
-            (req.voice_id or DEFAULT_VOICE_ID),
-        )
-        resp_dict["voice"] = voice
+async def attach_solution_voice(req: SolutionRequest, resp_dict: dict, spoken_text: str) -> dict:
+    if not req.with_voice:
         return resp_dict
+    voice = await asyncio.to_thread(
+        voice_payload_from_text,
+        spoken_text[:450],
+        (req.voice_id or DEFAULT_VOICE_ID),
+    )
+    resp_dict["voice"] = voice
+    return resp_dict
 
-    # (A) TOILET: Llama pipeline
-    if fixture_type == "toilet" and LLAMA_ENABLED:
-        t0 = time.time()
-        success, reasoner_output, error = refine_observation_and_build_query(analysis, session_id)
-        stage_latencies["reasoner1_ms"] = (time.time() - t0) * 1000
+# queued by Planner ②'s on_reset between the plan_delta pieces
+PLAN_STREAM_RESET = object()
 
-        if not success or not reasoner_output:
-            return {
-                "success": False,
-                "session_id": session_id,
-                "error": error or "Reasoner ① failed",
-                "error_stage": "reasoner1",
-                "stage_latencies": stage_latencies,
-            }
+async def toilet_solution_events(analysis: dict, session_id: str, stream_plan: bool = False) -> AsyncIterator[dict]:
+    """
+    Toilet Llama pipeline (Reasoner ① -> RAG -> Planner ②) as progress events.
+    Yields {"event": "reasoner1", ...} and {"event": "rag", ...} as stages finish,
+    then exactly one {"event": "result", ...} whose other keys are the /solution response.
+    stream_plan: Planner ② is streamed from Groq and its raw JSON text is yielded as
+    {"event": "plan_delta", "text": ...} pieces while it generates. A
+    {"event": "plan_reset"} means the stream was retried: discard the text so far.
+    """
+    t0_total = time.time()
+    stage_latencies = {}
 
-        retrieved_docs = []
-        retrieval_metrics = None
+    # Speculative RAG: retrieval is almost always needed here, so start it on the
+    # heuristic query while Reasoner ① runs; used below if ①'s query is close enough
+    prefetch_query = analysis_to_query(analysis)
+    prefetch_task = start_rag_prefetch(prefetch_query)
 
-        if getattr(reasoner_output, "requires_rag", False):
-            t0 = time.time()
-            try:
-                passages_raw = rag_retrieve(reasoner_output.rag_query, top_k=6) if RAG_ENABLED else []
-                retrieved_docs = normalize_passages(passages_raw)
-
-                if retrieved_docs:
-                    scores = [d.get("score") for d in retrieved_docs if d.get("score") is not None]
-                    retrieval_metrics = VectorRetrievalMetrics(
-                        avg_similarity_score=sum(scores) / len(scores) if scores else None,
-                        min_similarity_score=min(scores) if scores else None,
-                        max_similarity_score=max(scores) if scores else None,
-                        num_docs_retrieved=len(retrieved_docs),
-                        retrieval_latency_ms=(time.time() - t0) * 1000,
-                    )
-            except Exception:
-                pass
-            stage_latencies["rag_ms"] = (time.time() - t0) * 1000
-        else:
-            stage_latencies["rag_ms"] = 0.0
+    t0 = time.time()
+    success, reasoner_output, error = await refine_observation_and_build_query(analysis, session_id)
+    stage_latencies["reasoner1_ms"] = (time.time() - t0) * 1000
 
-        t0 = time.time()
-        success, fix_plan, error = generate_fix_plan(
-            reasoner_output=reasoner_output,
-            retrieved_docs=retrieved_docs,
-            retrieval_metrics=retrieval_metrics,
-            session_id=session_id,
-        )
-        stage_latencies["planner_ms"] = (time.time() - t0) * 1000
+    if not success or not reasoner_output:
+        yield {
+            "event": "result",
+            "success": False,
+            "session_id": session_id,
+            "error": error or "Reasoner ① failed",
+            "error_stage": "reasoner1",
+            "stage_latencies": stage_latencies,
+        }
+        return
 
-        if not success or not fix_plan:
-            return {
-                "success": False,
-                "session_id": session_id,
-                "error": error or "Planner failed",
-                "error_stage": "planner",
-                "reasoner_output": reasoner_output.model_dump() if reasoner_output else None,
-                "stage_latencies": stage_latencies,
-            }
+    reasoner_dump = reasoner_output.model_dump()
+    yield {
+        "event": "reasoner1",
+        "session_id": session_id,
+        "reasoner_output": reasoner_dump,
+        "stage_latencies": dict(stage_latencies),
+    }
 
-        total_latency_ms = (time.time() - t0_total) * 1000
-        stage_latencies["total_ms"] = total_latency_ms
+    retrieved_docs = []
+    retrieval_metrics = None
 
-        if USE_REDIS:
-            solution_data = {
-                "reasoner_output": reasoner_output.model_dump(),
-                "fix_plan": fix_plan.model_dump(),
-                "timestamp": time.time(),
-            }
-            redis_client.set(k_solution_latest(session_id), json.dumps(solution_data), ex=REDIS_TTL_SECONDS)
+    if getattr(reasoner_output, "requires_rag", False):
+        t0 = time.time()
+        try:
+            if prefetch_task is not None and query_overlap(reasoner_output.rag_query, prefetch_query) >= RAG_PREFETCH_MIN_OVERLAP:
+                passages_raw = await prefetch_task
+            elif RAG_ENABLED:
+                passages_raw = await asyncio.to_thread(rag_retrieve, reasoner_output.rag_query, 6)
+            else:
+                passages_raw = []
+            retrieved_docs = normalize_passages(passages_raw)
+
+            if retrieved_docs:
+                avg_score, min_score, max_score = passage_score_stats(retrieved_docs)
+                retrieval_metrics = VectorRetrievalMetrics(
+                    avg_similarity_score=avg_score,
+                    min_similarity_score=min_score,
+                    max_similarity_score=max_score,
+                    num_docs_retrieved=len(retrieved_docs),
+                    retrieval_latency_ms=(time.time() - t0) * 1000,
+                )
+        except Exception:
+            pass
+        stage_latencies["rag_ms"] = (time.time() - t0) * 1000
+    else:
+        stage_latencies["rag_ms"] = 0.0
 
-        out = {
-            "success": True,
+    yield {
+        "event": "rag",
+        "session_id": session_id,
+        "query": getattr(reasoner_output, "rag_query", ""),
+        "citations": retrieved_docs,
+        "stage_latencies": dict(stage_latencies),
+    }
+
+    t0 = time.time()
+    plan_kwargs = dict(
+        reasoner_output=reasoner_output,
+        retrieved_docs=retrieved_docs,
+        retrieval_metrics=retrieval_metrics,
+        session_id=session_id,
+    )
+    if not stream_plan:
+        success, fix_plan, error = await generate_fix_plan(**plan_kwargs)
+    else:
+        deltas: asyncio.Queue = asyncio.Queue()
+        plan_task = asyncio.create_task(generate_fix_plan(
+            **plan_kwargs,
+            on_delta=deltas.put_nowait,
+            on_reset=lambda: deltas.put_nowait(PLAN_STREAM_RESET),
+        ))
+        plan_task.add_done_callback(lambda _: deltas.put_nowait(None))
+        try:
+            done = False
+            while not done:
+                # everything that arrived while the client was being written to goes out as one line
+                pieces = [await deltas.get()]
+                while not deltas.empty():
+                    pieces.append(deltas.get_nowait())
+                done = None in pieces
+                resets = [i for i, p in enumerate(pieces) if p is PLAN_STREAM_RESET]
+                if resets:
+                    # Groq retry restarted the plan: the client drops its text so far
+                    pieces = pieces[resets[-1] + 1:]
+                    yield {"event": "plan_reset", "session_id": session_id}
+                text = "".join(p for p in pieces if isinstance(p, str))
+                if text:
+                    yield {"event": "plan_delta", "session_id": session_id, "text": text}
+            success, fix_plan, error = plan_task.result()
+        finally:
+            # client went away mid-plan: stop the Groq stream too
+            if not plan_task.done():
+                plan_task.cancel()
+    stage_latencies["planner_ms"] = (time.time() - t0) * 1000
+
+    if not success or not fix_plan:
+        yield {
+            "event": "result",
+            "success": False,
             "session_id": session_id,
-            "reasoner_output": reasoner_output.model_dump(),
-            "fix_plan": fix_plan.model_dump(),
-            "query": getattr(reasoner_output, "rag_query", ""),
-            "citations": retrieved_docs,
-            "solution": getattr(fix_plan, "summary", ""),
+            "error": error or "Planner failed",
+            "error_stage": "planner",
+            "reasoner_output": reasoner_dump,
             "stage_latencies": stage_latencies,
-            "total_latency_ms": total_latency_ms,
-            "routed_mode": "toilet_llama_pipeline",
         }
+        return
 
-        spoken = f"Here's what we'll do. {getattr(fix_plan, 'summary', '')}".strip()
+    total_latency_ms = (time.time() - t0_total) * 1000
+    stage_latencies["total_ms"] = total_latency_ms
+
+    fix_plan_dump = fix_plan.model_dump()
+    if USE_REDIS:
+        solution_data = {
+            "reasoner_output": reasoner_dump,
+            "fix_plan": fix_plan_dump,
+            "timestamp": time.time(),
+        }
+        await redis_client.set(k_solution_latest(session_id), orjson.dumps(solution_data), ex=REDIS_TTL_SOLUTION_SECONDS)
+
+    yield {
+        "event": "result",
+        "success": True,
+        "session_id": session_id,
+        "reasoner_output": reasoner_dump,
+        "fix_plan": fix_plan_dump,
+        "query": getattr(reasoner_output, "rag_query", ""),
+        "citations": retrieved_docs,
+        "solution": getattr(fix_plan, "summary", ""),
+        "stage_latencies": stage_latencies,
+        "total_latency_ms": total_latency_ms,
+        "routed_mode": "toilet_llama_pipeline",
+    }
+
+# ----------------------------
+# Cross-session solution cache (salient analysis fields -> /solution response)
+# ----------------------------
+solution_cache_local: TTLCache = TTLCache(maxsize=FRAME_CACHE_MAX, ttl=REDIS_TTL_SOLUTION_SECONDS)
+
+def solution_fingerprint(analysis: dict) -> str:
+    """Hash of the fields that drive the plan; cosmetic fields (confidences, location wording) don't count."""
+    issues = analysis.get("prospected_issues") or []
+    top = issues[0] if isinstance(issues, list) and issues and isinstance(issues[0], dict) else {}
+    salient = {
+        "fixture_type": str(analysis.get("fixture_type", "unknown")).lower(),
+        "issue": top.get("issue_name"),
+        "cause": top.get("suspected_cause"),
+        "symptoms": analysis.get("observed_symptoms"),
+        "danger": analysis.get("overall_danger_level"),
+        "shutoff": analysis.get("requires_shutoff"),
+    }
+    blob = orjson.dumps(salient, default=str, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+def k_solution_cache(fingerprint: str) -> str:
+    return f"solution:cache:{fingerprint}"
+
+async def get_cached_solution(key: str) -> Optional[bytes]:
+    if USE_REDIS:
+        return await redis_client.get(key)
+    return solution_cache_local.get(key)
+
+async def put_cached_solution(key: str, payload: bytes):
+    if USE_REDIS:
+        await redis_client.set(key, payload, ex=REDIS_TTL_SOLUTION_SECONDS)
+    else:
+        solution_cache_local[key] = payload
+
+@app.post("/solution")
+async def generate_solution(req: SolutionRequest, request: Request):
+    analysis, err = await load_solution_analysis(req.session_id)
+    if err is not None:
+        return err
+
+    # voice is per-request synthesized audio: those calls neither read nor fill the cache
+    if req.with_voice:
+        return await solve_analysis(req, analysis)
+
+    # ETag = analysis fingerprint. A client re-asking with If-None-Match for the scene
+    # it already has a plan for (user idle on the same frame) gets a tiny JSON answer
+    # without any LLM work or cache read. JSON + 200 rather than a bodiless 304:
+    # fetch() callers parse every /solution reply.
+    fp = solution_fingerprint(analysis)
+    etag = f'"{fp}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return ORJSONResponse(
+            {"success": True, "unchanged": True, "session_id": req.session_id},
+            headers={"ETag": etag},
+        )
+
+    out = await cached_solution(req, analysis, fp)
+    return ORJSONResponse(out, headers={"ETag": etag} if out.get("success") else None)
+
+def solution_latest_value(out: dict) -> bytes:
+    """solution:latest for a cached /solution response, in the shape its routed mode stores."""
+    mode = out.get("routed_mode")
+    if mode == "toilet_llama_pipeline":
+        return orjson.dumps({
+            "reasoner_output": out.get("reasoner_output"),
+            "fix_plan": out.get("fix_plan"),
+            "timestamp": time.time(),
+        }, default=str)
+    if mode == "pipe_groq":
+        return orjson.dumps({
+            "mode": mode,
+            "query": out.get("query"),
+            "citations": out.get("citations"),
+            "solution": out.get("solution"),
+            "timestamp": time.time(),
+        }, default=str)
+    # Gemini paths store the plain solution text
+    return str(out.get("solution") or "").encode("utf-8")
+
+async def cached_solution(req: SolutionRequest, analysis: dict, fp: str) -> dict:
+    """solve_analysis behind the fingerprint-keyed solution cache."""
+    t0 = time.time()
+    cache_key = k_solution_cache(fp)
+    cached = await get_cached_solution(cache_key)
+    if cached is not None:
+        out = orjson.loads(cached)
+        out["session_id"] = req.session_id
+        out["cached"] = True
+        # this request's own timing, not the run that filled the cache
+        lookup_ms = (time.time() - t0) * 1000
+        out["stage_latencies"] = {"cache_ms": lookup_ms, "total_ms": lookup_ms}
+        out["total_latency_ms"] = lookup_ms
+        if USE_REDIS:
+            # same per-session record a fresh run leaves behind (backstage, /solution/latest readers)
+            await redis_client.set(k_solution_latest(req.session_id), solution_latest_value(out), ex=REDIS_TTL_SOLUTION_SECONDS)
+        return out
+
+    out = await solve_analysis(req, analysis)
+    if out.get("success"):
+        await put_cached_solution(cache_key, orjson.dumps(out, default=str))
+    return out
+
+async def solve_analysis(req: SolutionRequest, analysis: dict) -> dict:
+    """The actual /solution routing (toilet Llama / pipe / generic), no cache."""
+    session_id = req.session_id
+    t0_total = time.time()
+    stage_latencies = {}
+
+    fixture_type = str(analysis.get("fixture_type", "unknown")).lower()
+
+    async def _attach_voice(resp_dict: dict, spoken_text: str):
+        return await attach_solution_voice(req, resp_dict, spoken_text)
+
+    # (A) TOILET: Llama pipeline
+    if fixture_type == "toilet" and LLAMA_ENABLED:
+        async for ev in toilet_solution_events(analysis, session_id):
+            out = ev
+        del out["event"]
+        if not out["success"]:
+            return out
+        spoken = f"Here's what we'll do. {out['solution']}".strip()
         return await _attach_voice(out, spoken)
 
+    # Pipe / generic prompts embed the analysis verbatim: serialize it once here
+    # so a Groq -> Gemini fallback reuses the same string.
+    analysis_json = _dumps(analysis, indent=True)
+
     # (B) PIPE: Groq pipe plan if possible
     if fixture_type == "pipe":
         if groq_client:
             try:
                 t0 = time.time()
-                solution_text, citations, query = await groq_solution_text_for_pipe(analysis)
+                solution_text, citations, query = await groq_solution_text_for_pipe(analysis, analysis_json)
                 stage_latencies["groq_ms"] = (time.time() - t0) * 1000
 
                 total_latency_ms = (time.time() - t0_total) * 1000
                 stage_latencies["total_ms"] = total_latency_ms
 
                 if USE_REDIS:
-                    redis_client.set(
+                    await redis_client.set(
                         k_solution_latest(session_id),
-                        json.dumps(
+                        orjson.dumps(
                             {
                                 "mode": "pipe_groq",
                                 "query": query,
@@ -1752,7 +2763,7 @@ async def generate_solution(req: SolutionRequest):
                                 "timestamp": time.time(),
                             }
                         ),
-                        ex=REDIS_TTL_SECONDS,
+                        ex=REDIS_TTL_SOLUTION_SECONDS,
                     )
 
                 out = {
@@ -1778,23 +2789,24 @@ async def generate_solution(req: SolutionRequest):
         return await _legacy_gemini_solution(
             req, analysis, session_id,
             forced_query=build_rag_query_general(analysis),
-            routed_mode="pipe_gemini_fallback"
+            routed_mode="pipe_gemini_fallback",
+            analysis_json=analysis_json,
         )
 
     # (C) OTHER: Groq generic if possible
     if groq_client:
         try:
             t0 = time.time()
-            solution_text, citations, query = await groq_solution_text_generic(analysis)
+            solution_text, citations, query = await groq_solution_text_generic(analysis, analysis_json)
             stage_latencies["groq_ms"] = (time.time() - t0) * 1000
 
             total_latency_ms = (time.time() - t0_total) * 1000
             stage_latencies["total_ms"] = total_latency_ms
 
             if USE_REDIS:
-                redis_client.set(
+                await redis_client.set(
                     k_solution_latest(session_id),
-                    json.dumps(
+                    orjson.dumps(
                         {
                             "mode": "generic_groq",
                             "query": query,
@@ -1803,7 +2815,7 @@ async def generate_solution(req: SolutionRequest):
                             "timestamp": time.time(),
                         }
                     ),
-                    ex=REDIS_TTL_SECONDS,
+                    ex=REDIS_TTL_SOLUTION_SECONDS,
                 )
 
             out = {
@@ -1825,44 +2837,60 @@ async def generate_solution(req: SolutionRequest):
     out = await _legacy_gemini_solution(
         req, analysis, session_id,
         forced_query=build_rag_query_general(analysis),
-        routed_mode="generic_gemini"
+        routed_mode="generic_gemini",
+        analysis_json=analysis_json,
     )
     if out.get("success") and req.with_voice:
         out = await _attach_voice(out, "Here are the safest next steps based on what I see.")
     return out
 
-# ============================================================
-# Legacy Gemini-only solution (fallback)
-# ============================================================
+def _ndjson(event: dict) -> bytes:
+    return orjson.dumps(event, default=str, option=orjson.OPT_NON_STR_KEYS) + b"\n"
 
-async def _legacy_gemini_solution(
-    req: SolutionRequest,
-    analysis: dict,
-    session_id: str,
-    forced_query: Optional[str] = None,
-    routed_mode: str = "legacy_gemini",
-):
-    try:
-        query = forced_query or analysis_to_query(analysis)
-    except Exception:
-        query = forced_query or build_rag_query_general(analysis)
+@app.post("/solution/stream")
+async def generate_solution_stream(req: SolutionRequest):
+    """
+    /solution as NDJSON, for clients that want progress before the plan is ready.
+    Toilet (Llama pipeline): a "reasoner1" line, a "rag" line, "plan_delta" lines with
+    the fix plan's JSON text as Planner ② writes it ("plan_reset" = a retry started
+    the text over), then the "result" line.
+    Other fixtures: just the "result" line. The "result" line minus its "event" key
+    is exactly the /solution response.
+    """
+    analysis, err = await load_solution_analysis(req.session_id)
+
+    async def events():
+        if err is not None:
+            yield _ndjson({"event": "result", **err})
+            return
+        if str(analysis.get("fixture_type", "unknown")).lower() == "toilet" and LLAMA_ENABLED:
+            async for ev in toilet_solution_events(analysis, req.session_id, stream_plan=True):
+                if ev["event"] == "result" and ev["success"]:
+                    ev = await attach_solution_voice(req, ev, f"Here's what we'll do. {ev['solution']}".strip())
+                yield _ndjson(ev)
+            return
+        if req.with_voice:
+            out = await solve_analysis(req, analysis)
+        else:
+            out = await cached_solution(req, analysis, solution_fingerprint(analysis))
+        yield _ndjson({"event": "result", **out})
 
-    try:
-        passages_raw = rag_retrieve(query, top_k=6) if RAG_ENABLED else []
-    except Exception:
-        passages_raw = []
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
-    citations = normalize_passages(passages_raw)
+# ============================================================
+# Legacy Gemini-only solution (fallback)
+# ============================================================
 
-    prompt = f"""
+# Fixed text around the two JSON blocks; filled with str.format per call
+_LEGACY_SOLUTION_PROMPT = """
 You are FixDad, a careful home repair assistant.
 Tailor your answer to the detected fixture_type and top issue. Do NOT default to toilet steps.
 
 ANALYSIS_JSON:
-{json.dumps(analysis, ensure_ascii=False, indent=2)}
+{analysis_json}
 
 RETRIEVED_EXCERPTS:
-{json.dumps(citations, ensure_ascii=False, indent=2)}
+{citations_json}
 
 Output format:
 1) What I think is happening (1-2 sentences)
@@ -1879,9 +2907,34 @@ Rules:
 - No chemical drain cleaners.
 """.strip()
 
+async def _legacy_gemini_solution(
+    req: SolutionRequest,
+    analysis: dict,
+    session_id: str,
+    forced_query: Optional[str] = None,
+    routed_mode: str = "legacy_gemini",
+    analysis_json: Optional[str] = None,
+):
+    try:
+        query = forced_query or analysis_to_query(analysis)
+    except Exception:
+        query = forced_query or build_rag_query_general(analysis)
+
+    try:
+        passages_raw = await asyncio.to_thread(rag_retrieve, query, 6) if RAG_ENABLED else []
+    except Exception:
+        passages_raw = []
+
+    citations = normalize_passages(passages_raw)
+
+    prompt = _LEGACY_SOLUTION_PROMPT.format(
+        analysis_json=analysis_json or _dumps(analysis, indent=True),
+        citations_json=_dumps(citations, indent=True),
+    )
+
     try:
-        resp = await asyncio.wait_for(
-            asyncio.to_thread(model.generate_content, [prompt]),
+        resp_text = await asyncio.wait_for(
+            gemini_generate_text([prompt]),
             timeout=REQUEST_TIMEOUT_SECONDS,
         )
     except asyncio.TimeoutError:
@@ -1889,10 +2942,10 @@ Rules:
     except Exception as e:
         return {"success": False, "error": f"Gemini API error (solution): {repr(e)}", "session_id": session_id}
 
-    solution_text = (resp.text or "").strip()
+    solution_text = resp_text.strip()
 
     if USE_REDIS:
-        redis_client.set(k_solution_latest(session_id), solution_text, ex=REDIS_TTL_SECONDS)
+        await redis_client.set(k_solution_latest(session_id), solution_text, ex=REDIS_TTL_SOLUTION_SECONDS)
 
     return {
         "success": True,
@@ -1903,6 +2956,183 @@ Rules:
         "routed_mode": routed_mode,
     }
 
+# ============================================================
+# Backstage viewer push (WebSocket)
+# ============================================================
+# The viewer holds one socket per session instead of polling six endpoints.
+# A topic is re-sent only when its key changes: Redis keyspace notifications in
+# Redis mode, a cheap in-process version check in in-memory mode.
+BACKSTAGE_TOPICS: Tuple[str, ...] = ("redis", "latest", "history", "solution", "guide")
+
+# K = keyspace channel; $ string SET, g DEL/EXPIRE, x expiry
+KEYSPACE_EVENT_FLAGS = "K$gx"
+KEYSPACE_EVENTS_AVAILABLE = False
+
+# Close codes the viewer acts on: 4000 = no push here (stay on HTTP polling),
+# 1013 = subscriber cap reached (poll, retry the socket later)
+WS_CLOSE_PUSH_UNAVAILABLE = 4000
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+backstage_subscribers = 0
+
+@app.on_event("startup")
+async def enable_keyspace_events():
+    global KEYSPACE_EVENTS_AVAILABLE
+    if not USE_REDIS:
+        return
+    try:
+        cur = next(iter((await redis_client.config_get("notify-keyspace-events")).values()), b"")
+        cur = cur.decode() if isinstance(cur, bytes) else str(cur)
+        missing = "".join(f for f in KEYSPACE_EVENT_FLAGS if f not in cur and not (f in "$gx" and "A" in cur))
+        if missing:
+            await redis_client.config_set("notify-keyspace-events", cur + missing)
+        KEYSPACE_EVENTS_AVAILABLE = True
+    except Exception as e:
+        # managed Redis often blocks CONFIG: no change feed, the viewer polls over HTTP
+        print(f"⚠️ keyspace notifications unavailable ({e}); backstage viewer will poll")
+
+def backstage_key_topics(session_id: str) -> Dict[str, Tuple[str, ...]]:
+    return {
+        k_latest(session_id): ("latest", "history"),  # store_analysis writes both together
+        k_guide_state(session_id): ("guide",),
+        k_solution_latest(session_id): ("solution",),
+    }
+
+async def backstage_topic_payload(topic: str, session_id: str, limit: int) -> bytes:
+    """JSON of what the matching HTTP endpoint returns for this topic."""
+    if topic == "redis":
+        body: Any = await debug_redis()
+    elif topic == "latest":
+        item = await get_latest(session_id)
+        body = ({"success": True, "session_id": session_id, "latest": item} if item
+                else {"success": False, "error": "No latest analysis yet", "session_id": session_id})
+    elif topic == "history":
+        hist = await get_history(session_id, limit)
+        body = {"success": True, "session_id": session_id, "count": len(hist), "history": hist,
+                "storage": "redis" if USE_REDIS else "in-memory"}
+    elif topic == "guide":
+        body = await guide_state(session_id)
+    else:
+        raw = await redis_client.get(k_solution_latest(session_id)) if USE_REDIS else None
+        if raw is None:
+            body = {"success": False, "error": "No solution yet", "session_id": session_id}
+        else:
+            try:
+                sol: Any = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                sol = raw.decode("utf-8", "replace")  # legacy Gemini path stores plain text
+            body = {"success": True, "session_id": session_id, "solution": sol}
+    return body.body if isinstance(body, Response) else orjson.dumps(body, default=str)
+
+async def backstage_topic_json(topic: str, session_id: str, limit: int) -> bytes:
+    """One socket message: {"topic", "payload"}."""
+    payload = await backstage_topic_payload(topic, session_id, limit)
+    return b'{"topic":"' + topic.encode() + b'","payload":' + payload + b"}"
+
+async def backstage_changes(session_id: str) -> AsyncIterator[set]:
+    """Yields the set of topics that changed, once per burst of writes."""
+    if USE_REDIS:
+        channels = {
+            f"__keyspace@{REDIS_DB}__:{key}".encode(): topics
+            for key, topics in backstage_key_topics(session_id).items()
+        }
+        pubsub = backstage_redis.pubsub()
+        await pubsub.subscribe(*channels)
+        try:
+            while True:
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if msg is None:
+                    continue
+                changed = set(channels.get(msg["channel"], ()))
+                # a /frame or guide step touches several keys back to back: one push for all
+                while (msg := await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.05)) is not None:
+                    changed.update(channels.get(msg["channel"], ()))
+                if changed:
+                    yield changed
+        finally:
+            await pubsub.aclose()
+    else:
+        def version():
+            st = guide_state_by_session.get(session_id)
+            return latest_etag_by_session.get(session_id), (st.last_updated if st else None)
+        last = version()
+        while True:
+            await asyncio.sleep(BACKSTAGE_MEM_POLL_SECONDS)
+            cur = version()
+            changed = set()
+            if cur[0] != last[0]:
+                changed.update(("latest", "history"))
+            if cur[1] != last[1]:
+                changed.add("guide")
+            last = cur
+            if changed:
+                yield changed
+
+@app.get("/backstage/bundle/{session_id}")
+async def backstage_bundle(session_id: str, limit: int = 8):
+    """
+    Every backstage topic in one response ({redis, latest, history, solution, guide}),
+    fetched concurrently: the viewer's HTTP fallback makes one request per tick, not five.
+    """
+    payloads = await asyncio.gather(
+        *(backstage_topic_payload(t, session_id, limit) for t in BACKSTAGE_TOPICS),
+        return_exceptions=True,
+    )
+    parts = [
+        b'"' + t.encode() + b'":' + (orjson.dumps({"__error": repr(p)}) if isinstance(p, BaseException) else p)
+        for t, p in zip(BACKSTAGE_TOPICS, payloads)
+    ]
+    return Response(b"{" + b",".join(parts) + b"}", media_type="application/json")
+
+@app.websocket("/ws/backstage/{session_id}")
+async def backstage_ws(websocket: WebSocket, session_id: str, limit: int = 8):
+    """Every topic once on connect and on a "refresh" message, then only what changed."""
+    global backstage_subscribers
+    await websocket.accept()
+    if USE_REDIS and not KEYSPACE_EVENTS_AVAILABLE:
+        # nothing would ever be pushed after the first snapshot
+        await websocket.close(code=WS_CLOSE_PUSH_UNAVAILABLE, reason="push unavailable")
+        return
+    if USE_REDIS and backstage_subscribers >= BACKSTAGE_MAX_SUBSCRIBERS:
+        await websocket.close(code=WS_CLOSE_TRY_AGAIN_LATER, reason="too many viewers")
+        return
+    backstage_subscribers += 1
+    inbox: asyncio.Queue = asyncio.Queue()
+    inbox.put_nowait(BACKSTAGE_TOPICS)
+
+    async def read_client():
+        try:
+            while True:
+                if await websocket.receive_text() == "refresh":
+                    inbox.put_nowait(BACKSTAGE_TOPICS)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            inbox.put_nowait(None)
+
+    async def watch():
+        try:
+            async for changed in backstage_changes(session_id):
+                inbox.put_nowait(changed)
+        except Exception as e:
+            # lost the change feed: close, the viewer falls back to HTTP polling
+            print(f"⚠️ backstage watch failed: {e!r}")
+            inbox.put_nowait(None)
+
+    tasks = [asyncio.create_task(read_client()), asyncio.create_task(watch())]
+    try:
+        while (topics := await inbox.get()) is not None:
+            for topic in BACKSTAGE_TOPICS:  # fixed order: latest before history, etc.
+                if topic in topics:
+                    await websocket.send_text((await backstage_topic_json(topic, session_id, limit)).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        backstage_subscribers -= 1
+        for t in tasks:
+            t.cancel()
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
+
 # ============================================================
 # ✅ TEXT-TO-SPEECH ENDPOINT (ElevenLabs)
 # ============================================================
@@ -1934,4 +3164,23 @@ async def text_to_speech(request: TTSRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
+
+    # UVICORN_RELOAD=1 (default): single dev process with auto-reload.
+    # UVICORN_RELOAD=0: production runner. More than one worker only makes sense
+    # with Redis up; the in-memory fallback state is per process.
+    if os.environ.get("UVICORN_RELOAD", "1") == "1":
+        uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
+    else:
+        workers = int(os.environ.get("UVICORN_WORKERS", str(os.cpu_count() or 1)))
+        # worker processes re-import app: let them know they aren't alone (guide state cache)
+        os.environ["UVICORN_WORKERS"] = str(workers)
+        uvicorn.run(
+            "app:app",
+            host="0.0.0.0",
+            port=int(os.environ.get("PORT", "8000")),
+            workers=workers,
+            loop="auto",   # uvloop when installed (uvicorn[standard])
+            http="auto",   # httptools when installed
+            access_log=False,
+            limit_concurrency=int(os.environ.get("UVICORN_LIMIT_CONCURRENCY", "200")),
+        )
@@ -22,9 +22,22 @@ Why temperature=0.1?
 
 import os
 import time
-import json
-from typing import Optional, Any
-from groq import Groq, RateLimitError, APIError
+import asyncio
+import hashlib
+import logging
+import httpx
+from contextvars import ContextVar
+import orjson
+from typing import Optional, Any, Callable
+from cachetools import TTLCache
+from groq import AsyncGroq, RateLimitError, APIError
+
+# Optional: HTTP/2 for the Groq connection (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
 
 # ============================================================
 # Configuration
@@ -35,10 +48,30 @@ if not GROQ_API_KEY:
     print("⚠️ GROQ_API_KEY not found in environment. Llama reasoning will fail.")
     print("   Get your key at: https://console.groq.com/keys")
 
-# Groq client (singleton)
-groq_client: Optional[Groq] = None
+# retry notices share the /solution stage logger (see app.py)
+logger = logging.getLogger("solution.llama")
+
+# Groq client (singleton). Async: a 0.5-2s completion (and its backoff sleeps)
+# awaits on the event loop instead of holding a worker thread.
+# Explicit keep-alive pool (HTTP/2 when h2 is installed): Reasoner ① / Planner ②
+# calls from concurrent sessions share one warm TLS connection.
+GROQ_TIMEOUT_SECONDS = float(os.environ.get("GROQ_TIMEOUT_SECONDS", "30"))
+groq_http = httpx.AsyncClient(
+    http2=HTTP2_AVAILABLE,
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+    timeout=GROQ_TIMEOUT_SECONDS,
+)
+groq_client: Optional[AsyncGroq] = None
 if GROQ_API_KEY:
-    groq_client = Groq(api_key=GROQ_API_KEY)
+    groq_client = AsyncGroq(api_key=GROQ_API_KEY, http_client=groq_http)
+
+# groq_http binds to the loop of its first request: llama_reason_sync runs each call
+# on a fresh asyncio.run loop with its own throwaway client, set here for that run only.
+_loop_client: ContextVar[Optional[AsyncGroq]] = ContextVar("groq_loop_client", default=None)
+
+
+def _groq() -> Optional[AsyncGroq]:
+    return _loop_client.get() or groq_client
 
 # Model configuration
 LLAMA_MODEL = "llama-3.3-70b-versatile"
@@ -48,17 +81,101 @@ RETRY_ATTEMPTS = 3  # Number of retries on transient errors
 RETRY_DELAY_SECONDS = 1.0  # Initial delay between retries (exponential backoff)
 
 
+# ============================================================
+# Response Cache
+# ============================================================
+# At temperature ~0.1 the same request gives (practically) the same answer, so
+# successful results are reused instead of paying 0.5-2s + tokens again
+# (demo replays, Reasoner ② re-runs on the same refined JSON).
+# app.py points response_cache_redis at its client (shared across workers);
+# standalone use falls back to a per-process TTLCache.
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", "3600"))
+LLM_CACHE_MAX_TEMPERATURE = 0.3  # above this, answers are meant to vary
+response_cache_redis = None  # redis.asyncio.Redis, set by app.py when Redis is up
+_local_response_cache: TTLCache = TTLCache(maxsize=256, ttl=max(LLM_CACHE_TTL_SECONDS, 1))
+# cache key -> result of the request currently running for it (cache-miss stampede)
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def _response_cache_key(system_prompt: str, kwargs: dict[str, Any]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in (LLAMA_MODEL, str(kwargs["temperature"]), str(kwargs["max_tokens"]),
+                 str("response_format" in kwargs), system_prompt, kwargs["messages"][-1]["content"]):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return "llm:" + h.hexdigest()
+
+
+async def _cache_get(key: str) -> Optional[dict[str, Any]]:
+    try:
+        if response_cache_redis is not None:
+            raw = await response_cache_redis.get(key)
+            return orjson.loads(raw) if raw else None
+        return _local_response_cache.get(key)
+    except Exception as e:
+        logger.warning("⚠️ LLM cache read failed: %r", e)
+        return None
+
+
+async def _cache_put(key: str, result: dict[str, Any]) -> None:
+    try:
+        if response_cache_redis is not None:
+            await response_cache_redis.set(key, orjson.dumps(result), ex=LLM_CACHE_TTL_SECONDS)
+        else:
+            _local_response_cache[key] = result
+    except Exception as e:
+        logger.warning("⚠️ LLM cache write failed: %r", e)
+
+
+# ============================================================
+# Circuit Breaker
+# ============================================================
+# During a Groq outage every caller would otherwise sit through the full retry
+# backoff (1s + 2s) and keep feeding the rate limiter. After
+# LLM_BREAKER_FAILURES failed calls within LLM_BREAKER_WINDOW_SECONDS the
+# breaker opens and new calls fail immediately for LLM_BREAKER_OPEN_SECONDS.
+# The first call after that is a trial: success closes it, failure reopens it.
+# Response-cache hits are served either way (the lookup runs first).
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_WINDOW_SECONDS = float(os.environ.get("LLM_BREAKER_WINDOW_SECONDS", "30"))
+LLM_BREAKER_OPEN_SECONDS = float(os.environ.get("LLM_BREAKER_OPEN_SECONDS", "60"))
+_breaker: dict[str, float] = {"fails": 0, "first_fail_at": 0.0, "opened_at": 0.0}
+
+
+def _breaker_remaining() -> float:
+    """Seconds until the breaker lets a call through again (0 = closed)."""
+    if not _breaker["opened_at"]:
+        return 0.0
+    return max(0.0, _breaker["opened_at"] + LLM_BREAKER_OPEN_SECONDS - time.time())
+
+
+def _breaker_success() -> None:
+    _breaker.update(fails=0, first_fail_at=0.0, opened_at=0.0)
+
+
+def _breaker_failure() -> None:
+    now = time.time()
+    if now - _breaker["first_fail_at"] > LLM_BREAKER_WINDOW_SECONDS:
+        _breaker.update(fails=0, first_fail_at=now)
+    _breaker["fails"] += 1
+    if _breaker["opened_at"] or _breaker["fails"] >= LLM_BREAKER_FAILURES:
+        _breaker["opened_at"] = now
+        logger.warning("🚫 Groq circuit open after %d failures; failing fast for %.0fs", _breaker["fails"], LLM_BREAKER_OPEN_SECONDS)
+
+
 # ============================================================
 # Core Llama Reasoning Function
 # ============================================================
 
-def llama_reason(
+async def llama_reason(
     prompt: str,
     json_mode: bool = False,
     temperature: float = DETERMINISTIC_TEMPERATURE,
     max_tokens: int = MAX_TOKENS,
     system_prompt: Optional[str] = None,
     retry_attempts: int = RETRY_ATTEMPTS,
+    on_delta: Optional[Callable[[str], None]] = None,
+    on_reset: Optional[Callable[[], None]] = None,
 ) -> dict[str, Any]:
     """
     Call Llama 3.3 70B via Groq with deterministic settings.
@@ -70,6 +187,13 @@ def llama_reason(
         max_tokens: Maximum tokens in response
         system_prompt: Optional system prompt (defaults to reasoning-focused prompt)
         retry_attempts: Number of retry attempts on transient errors
+        on_delta: If set, the completion is streamed and each content piece is
+            passed to it as it arrives (a cache hit, or joining an identical
+            request already in flight, passes the whole content once).
+        on_reset: Called when a stream that already sent pieces to on_delta fails
+            and is retried from the start: drop what was received so far. Without
+            it, a failure after the first piece is not retried.
+            The return value is the same as without it.
 
     Returns:
         {
@@ -81,15 +205,16 @@ def llama_reason(
             "latency_ms": float,
             "model": str,
             "temperature": float,
+            "cached": True,  # only on a response-cache hit
         }
 
     Example:
-        >>> result = llama_reason("Analyze this: {json_data}", json_mode=True)
+        >>> result = await llama_reason("Analyze this: {json_data}", json_mode=True)
         >>> if result["success"]:
         >>>     analysis = result["parsed_json"]
         >>>     print(f"Confidence: {analysis['confidence']}")
     """
-    if not groq_client:
+    if not _groq():
         return {
             "success": False,
             "content": "",
@@ -135,23 +260,110 @@ def llama_reason(
     if json_mode:
         kwargs["response_format"] = {"type": "json_object"}
 
+    cache_key = None
+    if LLM_CACHE_TTL_SECONDS > 0 and temperature <= LLM_CACHE_MAX_TEMPERATURE:
+        cache_key = _response_cache_key(system_prompt, kwargs)
+        cached = await _cache_get(cache_key)
+        if cached is not None:
+            if on_delta is not None and cached.get("content"):
+                on_delta(cached["content"])
+            return {**cached, "cached": True}
+
+    remaining = _breaker_remaining()
+    if remaining > 0:
+        return {
+            "success": False,
+            "content": "",
+            "parsed_json": None,
+            "error": f"circuit_open: Groq failing, retry in {remaining:.0f}s",
+            "tokens_used": 0,
+            "latency_ms": 0.0,
+            "model": LLAMA_MODEL,
+            "temperature": temperature,
+        }
+
+    if cache_key is None:
+        return await _complete_with_retries(kwargs, json_mode, retry_attempts, on_delta, on_reset, cache_key)
+
+    # Single-flight: identical concurrent calls share one in-flight request
+    pending = _inflight.get(cache_key)
+    if pending is not None:
+        result = dict(await asyncio.shield(pending))
+        if on_delta is not None and result.get("content"):
+            on_delta(result["content"])
+        return result
+
+    fut: asyncio.Future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = fut
+    try:
+        result = await _complete_with_retries(kwargs, json_mode, retry_attempts, on_delta, on_reset, cache_key)
+        fut.set_result(result)
+        return result
+    finally:
+        if not fut.done():
+            # leader cancelled: followers get a failure instead of hanging
+            fut.set_result({
+                "success": False,
+                "content": "",
+                "parsed_json": None,
+                "error": "Shared Groq request was cancelled",
+                "tokens_used": 0,
+                "latency_ms": 0.0,
+                "model": LLAMA_MODEL,
+                "temperature": kwargs["temperature"],
+            })
+        del _inflight[cache_key]
+
+
+async def _complete_with_retries(
+    kwargs: dict[str, Any],
+    json_mode: bool,
+    retry_attempts: int,
+    on_delta: Optional[Callable[[str], None]],
+    on_reset: Optional[Callable[[], None]],
+    cache_key: Optional[str],
+) -> dict[str, Any]:
+    """Groq completion with retry/backoff; stores successes under cache_key."""
+    temperature = kwargs["temperature"]
+
+    # Pieces already handed to on_delta can't be taken back: a retry restarts the
+    # text from scratch, so it needs on_reset first (or isn't attempted at all).
+    streamed = False
+
+    def relay(piece: str) -> None:
+        nonlocal streamed
+        streamed = True
+        on_delta(piece)
+
+    def can_retry() -> bool:
+        return not streamed or on_reset is not None
+
+    def before_retry() -> None:
+        nonlocal streamed
+        if streamed:
+            on_reset()
+            streamed = False
+
     # Retry loop with exponential backoff
     last_error: Optional[Exception] = None
     for attempt in range(1, retry_attempts + 1):
         try:
             t0 = time.time()
-            response = groq_client.chat.completions.create(**kwargs)
+            if on_delta is None:
+                response = await _groq().chat.completions.create(**kwargs)
+                content = response.choices[0].message.content or ""
+                tokens_used = response.usage.total_tokens if response.usage else 0
+            else:
+                content, tokens_used = await _stream_completion(kwargs, relay)
             latency_ms = (time.time() - t0) * 1000
-
-            content = response.choices[0].message.content or ""
-            tokens_used = response.usage.total_tokens if response.usage else 0
+            _breaker_success()
 
             # Parse JSON if json_mode is enabled
             parsed_json = None
             if json_mode and content.strip():
                 try:
-                    parsed_json = json.loads(content)
-                except json.JSONDecodeError as e:
+                    parsed_json = orjson.loads(content)
+                except orjson.JSONDecodeError as e:
                     return {
                         "success": False,
                         "content": content,
@@ -163,7 +375,7 @@ def llama_reason(
                         "temperature": temperature,
                     }
 
-            return {
+            result = {
                 "success": True,
                 "content": content,
                 "parsed_json": parsed_json,
@@ -173,14 +385,19 @@ def llama_reason(
                 "model": LLAMA_MODEL,
                 "temperature": temperature,
             }
+            if cache_key is not None:
+                await _cache_put(cache_key, result)
+            return result
 
         except RateLimitError as e:
             last_error = e
-            if attempt < retry_attempts:
+            if attempt < retry_attempts and can_retry():
                 delay = RETRY_DELAY_SECONDS * (2 ** (attempt - 1))  # Exponential backoff
-                print(f"⚠️ Groq rate limit hit (attempt {attempt}/{retry_attempts}). Retrying in {delay:.1f}s...")
-                time.sleep(delay)
+                logger.warning("⚠️ Groq rate limit hit (attempt %d/%d). Retrying in %.1fs...", attempt, retry_attempts, delay)
+                await asyncio.sleep(delay)
+                before_retry()
             else:
+                _breaker_failure()
                 return {
                     "success": False,
                     "content": "",
@@ -195,11 +412,13 @@ def llama_reason(
         except APIError as e:
             last_error = e
             # Retry on transient API errors (5xx)
-            if attempt < retry_attempts and (500 <= getattr(e, "status_code", 0) < 600):
+            if attempt < retry_attempts and (500 <= getattr(e, "status_code", 0) < 600) and can_retry():
                 delay = RETRY_DELAY_SECONDS * (2 ** (attempt - 1))
-                print(f"⚠️ Groq API error {getattr(e, 'status_code', '?')} (attempt {attempt}/{retry_attempts}). Retrying in {delay:.1f}s...")
-                time.sleep(delay)
+                logger.warning("⚠️ Groq API error %s (attempt %d/%d). Retrying in %.1fs...", getattr(e, "status_code", "?"), attempt, retry_attempts, delay)
+                await asyncio.sleep(delay)
+                before_retry()
             else:
+                _breaker_failure()
                 return {
                     "success": False,
                     "content": "",
@@ -213,6 +432,7 @@ def llama_reason(
 
         except Exception as e:
             # Non-retryable error
+            _breaker_failure()
             return {
                 "success": False,
                 "content": "",
@@ -237,14 +457,34 @@ def llama_reason(
     }
 
 
+async def _stream_completion(kwargs: dict[str, Any], on_delta: Callable[[str], None]) -> tuple[str, int]:
+    """stream=True completion: on_delta gets each content piece; returns (full content, tokens_used)."""
+    parts: list[str] = []
+    tokens_used = 0
+    stream = await _groq().chat.completions.create(**kwargs, stream=True)
+    async for chunk in stream:
+        if chunk.choices:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        # Groq reports usage on the last chunk
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage:
+            tokens_used = usage.total_tokens
+    return "".join(parts), tokens_used
+
+
 # ============================================================
 # Convenience Wrappers
 # ============================================================
 
-def llama_reason_json(
+async def llama_reason_json(
     prompt: str,
     temperature: float = DETERMINISTIC_TEMPERATURE,
     max_tokens: int = MAX_TOKENS,
+    on_delta: Optional[Callable[[str], None]] = None,
+    on_reset: Optional[Callable[[], None]] = None,
 ) -> dict[str, Any]:
     """
     Shortcut for JSON mode reasoning.
@@ -252,15 +492,17 @@ def llama_reason_json(
     Returns:
         Same as llama_reason(), but json_mode=True is enforced.
     """
-    return llama_reason(
+    return await llama_reason(
         prompt=prompt,
         json_mode=True,
         temperature=temperature,
         max_tokens=max_tokens,
+        on_delta=on_delta,
+        on_reset=on_reset,
     )
 
 
-def llama_reason_text(
+async def llama_reason_text(
     prompt: str,
     temperature: float = DETERMINISTIC_TEMPERATURE,
     max_tokens: int = MAX_TOKENS,
@@ -271,7 +513,7 @@ def llama_reason_text(
     Returns:
         Same as llama_reason(), but json_mode=False.
     """
-    return llama_reason(
+    return await llama_reason(
         prompt=prompt,
         json_mode=False,
         temperature=temperature,
@@ -279,10 +521,42 @@ def llama_reason_text(
     )
 
 
+def llama_reason_sync(**kwargs: Any) -> dict[str, Any]:
+    """llama_reason for scripts / sync callers with no running event loop."""
+    async def run() -> dict[str, Any]:
+        if not GROQ_API_KEY:
+            return await llama_reason(**kwargs)
+        # not groq_http: the shared pool would stay bound to this short-lived loop
+        async with httpx.AsyncClient(timeout=GROQ_TIMEOUT_SECONDS) as http:
+            _loop_client.set(AsyncGroq(api_key=GROQ_API_KEY, http_client=http))
+            return await llama_reason(**kwargs)
+
+    return asyncio.run(run())
+
+
 # ============================================================
 # Health Check
 # ============================================================
 
+async def warm_groq_connection() -> None:
+    """
+    Open the pooled Groq connection ahead of the first real request
+    (TLS + HTTP/2 setup, ~100-300ms). Lists models, so no tokens are spent.
+    """
+    if not groq_client:
+        return
+    try:
+        t0 = time.time()
+        await groq_client.models.list()
+        logger.debug("Groq connection warm (%.0fms)", (time.time() - t0) * 1000)
+    except Exception as e:
+        logger.warning("⚠️ Groq warm-up failed: %r", e)
+
+
+async def close_groq_client() -> None:
+    await groq_http.aclose()
+
+
 def test_groq_connection() -> bool:
     """
     Test Groq API connection with a simple query.
@@ -290,7 +564,7 @@ def test_groq_connection() -> bool:
     Returns:
         True if connection successful, False otherwise.
     """
-    result = llama_reason("Say 'OK' if you can read this.", json_mode=False, max_tokens=10)
+    result = llama_reason_sync(prompt="Say 'OK' if you can read this.", json_mode=False, max_tokens=10)
     if result["success"]:
         print(f"✅ Groq API connection OK (latency: {result['latency_ms']:.0f}ms, tokens: {result['tokens_used']})")
         return True
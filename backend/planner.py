@@ -16,8 +16,9 @@ Key goals:
 """
 
 import json
+import logging
 import time
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 from schemas import (
     FixPlan,
@@ -29,16 +30,21 @@ from schemas import (
 )
 from llama_client import llama_reason_json
 
+# stage logs go to the "solution" logger (app.py drains it on a QueueListener thread)
+logger = logging.getLogger("solution.planner")
+
 
 # ============================================================
 # Main Planner (Reasoner ②) Function
 # ============================================================
 
-def generate_fix_plan(
+async def generate_fix_plan(
     reasoner_output: ReasonerOutput,
     retrieved_docs: list[dict[str, Any]],
     retrieval_metrics: Optional[VectorRetrievalMetrics] = None,
     session_id: str = "unknown",
+    on_delta: Optional[Callable[[str], None]] = None,
+    on_reset: Optional[Callable[[], None]] = None,
 ) -> tuple[bool, Optional[FixPlan], Optional[str]]:
     """
     Llama Reasoner ② - Generate structured fix plan with hallucination detection.
@@ -49,6 +55,10 @@ def generate_fix_plan(
             Each doc should have: {rank, score, text, source}
         retrieval_metrics: Optional metrics from vector retrieval
         session_id: Session identifier for logging
+        on_delta: Optional callback for the raw plan JSON as Llama streams it
+            (progress display only; the returned FixPlan is still fully validated)
+        on_reset: Called when the stream restarts after a retry; discard the
+            text received through on_delta so far
 
     Returns:
         (success, fix_plan, error_message)
@@ -59,7 +69,7 @@ def generate_fix_plan(
     Example:
         >>> reasoner_output = ReasonerOutput(...)
         >>> docs = [{"rank": 1, "score": 0.85, "text": "...", "source": "manual.pdf"}]
-        >>> success, plan, error = generate_fix_plan(reasoner_output, docs)
+        >>> success, plan, error = await generate_fix_plan(reasoner_output, docs)
         >>> if success:
         ...     for step in plan.steps:
         ...         print(f"{step.step_number}. {step.title}")
@@ -70,7 +80,7 @@ def generate_fix_plan(
     # Step 1: Handle no-RAG case (trivial issues or no docs needed)
     # ============================================================
     if not reasoner_output.requires_rag or len(retrieved_docs) == 0:
-        print(f"[Planner ②] No RAG retrieval (requires_rag={reasoner_output.requires_rag}, docs={len(retrieved_docs)})")
+        logger.debug("[Planner ②] No RAG retrieval (requires_rag=%s, docs=%d)", reasoner_output.requires_rag, len(retrieved_docs))
         # Generate simple plan without citations
         return _generate_fallback_plan(reasoner_output, session_id)
 
@@ -82,16 +92,16 @@ def generate_fix_plan(
     # ============================================================
     # Step 3: Call Llama with JSON mode (deterministic)
     # ============================================================
-    print(f"[Planner ②] Calling Llama for session {session_id} with {len(retrieved_docs)} docs...")
-    result = llama_reason_json(prompt=prompt, temperature=0.1, max_tokens=4096)
+    logger.debug("[Planner ②] Calling Llama for session %s with %d docs...", session_id, len(retrieved_docs))
+    result = await llama_reason_json(prompt=prompt, temperature=0.1, max_tokens=4096, on_delta=on_delta, on_reset=on_reset)
 
     if not result["success"]:
         error_msg = f"Llama call failed: {result['error']}"
-        print(f"❌ [Planner ②] {error_msg}")
+        logger.warning("❌ [Planner ②] %s", error_msg)
         return False, None, error_msg
 
     latency_ms = (time.time() - t0) * 1000
-    print(f"✅ [Planner ②] Llama responded in {latency_ms:.0f}ms (tokens: {result['tokens_used']})")
+    logger.debug("✅ [Planner ②] Llama responded in %.0fms (tokens: %s)", latency_ms, result["tokens_used"])
 
     # ============================================================
     # Step 4: Parse and validate Llama JSON output
@@ -99,12 +109,12 @@ def generate_fix_plan(
     parsed_json = result["parsed_json"]
     if not parsed_json:
         error_msg = "Llama returned empty JSON"
-        print(f"❌ [Planner ②] {error_msg}")
+        logger.warning("❌ [Planner ②] %s", error_msg)
         return False, None, error_msg
 
     validation_error = _validate_fix_plan_json(parsed_json)
     if validation_error:
-        print(f"❌ [Planner ②] Validation failed: {validation_error}")
+        logger.warning("❌ [Planner ②] Validation failed: %s", validation_error)
         return False, None, validation_error
 
     # ============================================================
@@ -163,12 +173,15 @@ def generate_fix_plan(
             fallback_to_vision_only=False,
         )
 
-        print(f"✅ [Planner ②] Plan validated. Steps: {len(steps)}, Citation coverage: {citation_tracker.citation_coverage:.2f}, Hallucination risk: {citation_tracker.hallucination_risk_score:.2f}")
+        logger.debug(
+            "✅ [Planner ②] Plan validated. Steps: %d, Citation coverage: %.2f, Hallucination risk: %.2f",
+            len(steps), citation_tracker.citation_coverage, citation_tracker.hallucination_risk_score,
+        )
         return True, fix_plan, None
 
     except Exception as e:
         error_msg = f"Failed to build FixPlan: {type(e).__name__}: {str(e)}"
-        print(f"❌ [Planner ②] {error_msg}")
+        logger.warning("❌ [Planner ②] %s", error_msg)
         return False, None, error_msg
 
 
@@ -326,7 +339,7 @@ def _generate_fallback_plan(
     - RAG retrieval returned no documents
     - RAG retrieval failed entirely
     """
-    print(f"[Planner ②] Generating fallback plan (vision-only) for session {session_id}")
+    logger.debug("[Planner ②] Generating fallback plan (vision-only) for session %s", session_id)
 
     try:
         # Create minimal plan based on reasoner output
@@ -410,12 +423,12 @@ def _generate_fallback_plan(
             fallback_to_vision_only=True,
         )
 
-        print(f"✅ [Planner ②] Fallback plan generated with {len(steps)} steps")
+        logger.debug("✅ [Planner ②] Fallback plan generated with %d steps", len(steps))
         return True, fix_plan, None
 
     except Exception as e:
         error_msg = f"Failed to generate fallback plan: {type(e).__name__}: {str(e)}"
-        print(f"❌ [Planner ②] {error_msg}")
+        logger.warning("❌ [Planner ②] %s", error_msg)
         return False, None, error_msg
 
 
@@ -1,6 +1,6 @@
 # backend/rag_index.py
 import os, json, glob, re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, TypedDict
 
 import numpy as np
 import faiss
@@ -23,6 +23,16 @@ OVERLAP_CHARS = int(os.environ.get("RAG_OVERLAP_CHARS", "150"))
 # embedding model (빠르고 무난)
 EMBED_MODEL_NAME = os.environ.get("RAG_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
+# -----------------------
+# Result shape (app.normalize_passages takes a fast path on this)
+# -----------------------
+class Passage(TypedDict):
+    rank: int
+    score: Optional[float]
+    text: str
+    source: str
+    chunk_id: Optional[int]
+
 # -----------------------
 # Globals (lazy load)
 # -----------------------
@@ -144,7 +154,7 @@ def build_or_load_index(force_rebuild: bool = False) -> None:
         json.dump(_meta, f, ensure_ascii=False, indent=2)
 
 
-def rag_retrieve(query: str, top_k: int = 6) -> List[Dict[str, Any]]:
+def rag_retrieve(query: str, top_k: int = 6) -> List[Passage]:
     """
     returns:
       [
@@ -165,7 +175,7 @@ def rag_retrieve(query: str, top_k: int = 6) -> List[Dict[str, Any]]:
     qv = _embed_texts([query])  # (1, D)
     scores, idxs = _index.search(qv, top_k)
 
-    out: List[Dict[str, Any]] = []
+    out: List[Passage] = []
     for rank, (i, s) in enumerate(zip(idxs[0].tolist(), scores[0].tolist()), start=1):
         if i < 0 or i >= len(_meta):
             continue
@@ -16,6 +16,7 @@ Key goals:
 """
 
 import json
+import logging
 import time
 from typing import Any, Optional
 
@@ -26,12 +27,15 @@ from schemas import (
 )
 from llama_client import llama_reason_json
 
+# stage logs go to the "solution" logger (app.py drains it on a QueueListener thread)
+logger = logging.getLogger("solution.reasoner")
+
 
 # ============================================================
 # Main Reasoner ① Function
 # ============================================================
 
-def refine_observation_and_build_query(
+async def refine_observation_and_build_query(
     observation: dict[str, Any],
     session_id: str = "unknown",
 ) -> tuple[bool, Optional[ReasonerOutput], Optional[str]]:
@@ -55,7 +59,7 @@ def refine_observation_and_build_query(
         ...     "overall_danger_level": "medium",
         ...     ...
         ... }
-        >>> success, output, error = refine_observation_and_build_query(observation)
+        >>> success, output, error = await refine_observation_and_build_query(observation)
         >>> if success:
         ...     print(f"Refined issue: {output.refined_issue}")
         ...     print(f"RAG needed: {output.requires_rag}")
@@ -71,16 +75,16 @@ def refine_observation_and_build_query(
     # ============================================================
     # Step 2: Call Llama with JSON mode (deterministic)
     # ============================================================
-    print(f"[Reasoner ①] Calling Llama for session {session_id}...")
-    result = llama_reason_json(prompt=prompt, temperature=0.1, max_tokens=3000)
+    logger.debug("[Reasoner ①] Calling Llama for session %s...", session_id)
+    result = await llama_reason_json(prompt=prompt, temperature=0.1, max_tokens=3000)
 
     if not result["success"]:
         error_msg = f"Llama call failed: {result['error']}"
-        print(f"❌ [Reasoner ①] {error_msg}")
+        logger.warning("❌ [Reasoner ①] %s", error_msg)
         return False, None, error_msg
 
     latency_ms = (time.time() - t0) * 1000
-    print(f"✅ [Reasoner ①] Llama responded in {latency_ms:.0f}ms (tokens: {result['tokens_used']})")
+    logger.debug("✅ [Reasoner ①] Llama responded in %.0fms (tokens: %s)", latency_ms, result["tokens_used"])
 
     # ============================================================
     # Step 3: Parse and validate Llama JSON output
@@ -88,13 +92,13 @@ def refine_observation_and_build_query(
     parsed_json = result["parsed_json"]
     if not parsed_json:
         error_msg = "Llama returned empty JSON"
-        print(f"❌ [Reasoner ①] {error_msg}")
+        logger.warning("❌ [Reasoner ①] %s", error_msg)
         return False, None, error_msg
 
     # Validate output structure
     validation_error = _validate_reasoner_output(parsed_json)
     if validation_error:
-        print(f"❌ [Reasoner ①] Validation failed: {validation_error}")
+        logger.warning("❌ [Reasoner ①] Validation failed: %s", validation_error)
         return False, None, validation_error
 
     # ============================================================
@@ -131,12 +135,12 @@ def refine_observation_and_build_query(
             reasoning_trace=parsed_json.get("reasoning_trace", "No trace provided"),
         )
 
-        print(f"✅ [Reasoner ①] Output validated. Confidence: {statistical_metrics.confidence:.2f}, RAG needed: {reasoner_output.requires_rag}")
+        logger.debug("✅ [Reasoner ①] Output validated. Confidence: %.2f, RAG needed: %s", statistical_metrics.confidence, reasoner_output.requires_rag)
         return True, reasoner_output, None
 
     except Exception as e:
         error_msg = f"Failed to build ReasonerOutput: {type(e).__name__}: {str(e)}"
-        print(f"❌ [Reasoner ①] {error_msg}")
+        logger.warning("❌ [Reasoner ①] %s", error_msg)
         return False, None, error_msg
 
 
@@ -0,0 +1,45 @@
+import io
+import os
+import sys
+import unittest
+
+import PIL.Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import app  # noqa: E402
+
+
+def png_bytes(img: PIL.Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def gradient(mode: str) -> PIL.Image.Image:
+    """Right-to-left ramp: every neighbour comparison is true, so the dHash isn't all zeros."""
+    img = PIL.Image.new(mode, (64, 48))
+    img.putdata([(63 - x) * 4 for _ in range(48) for x in range(64)])
+    return img
+
+
+class DhashModesTest(unittest.TestCase):
+    def test_16bit_grey_png(self):
+        raw = png_bytes(gradient("I;16"))
+        self.assertEqual(PIL.Image.open(io.BytesIO(raw)).mode, "I;16")
+        part, h = app.prepare_frame(raw)
+        self.assertEqual(part["mime_type"], "image/png")
+        self.assertEqual(len(h), 16)
+        # same picture as 8-bit grey -> same hash
+        self.assertEqual(h, app.dhash_hex(gradient("L")))
+        self.assertNotEqual(int(h, 16), 0)
+
+    def test_other_modes(self):
+        for mode in ("I", "F", "P", "LA", "CMYK", "1", "L", "RGB", "RGBA"):
+            with self.subTest(mode=mode):
+                self.assertEqual(len(app.dhash_hex(PIL.Image.new(mode, (64, 48)))), 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
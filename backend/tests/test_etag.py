@@ -0,0 +1,25 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import app  # noqa: E402
+
+
+class EtagMatchTest(unittest.TestCase):
+    def test_forms(self):
+        etag = '"abc123"'
+        for header in ('"abc123"', 'abc123', 'W/"abc123"', '"x", W/"abc123"', "*"):
+            with self.subTest(header=header):
+                self.assertTrue(app.etag_matches(header, etag))
+
+    def test_mismatch(self):
+        for header in (None, "", '"abc12"', '"abc123-5"', 'W/"nope", "other"'):
+            with self.subTest(header=header):
+                self.assertFalse(app.etag_matches(header, '"abc123"'))
+
+
+if __name__ == "__main__":
+    unittest.main()
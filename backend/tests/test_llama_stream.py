@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+import httpx
+from groq import InternalServerError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import llama_client  # noqa: E402
+
+PLAN = json.dumps({"summary": "Plunge the toilet with firm strokes", "steps": ["a", "b"]})
+
+
+def chunk(text):
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=text))],
+        x_groq=None,
+    )
+
+
+def server_error():
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    return InternalServerError("boom", response=httpx.Response(500, request=request), body=None)
+
+
+class FlakyStream:
+    """chat.completions: the first stream dies after two pieces, the next ones complete."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, stream=False, **kwargs):
+        self.calls += 1
+        fail = self.calls == 1
+
+        async def pieces():
+            for i in range(0, len(PLAN), 7):
+                if fail and i >= 14:
+                    raise server_error()
+                yield chunk(PLAN[i:i + 7])
+                await asyncio.sleep(0)
+
+        return pieces()
+
+
+class StreamRetryTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.completions = FlakyStream()
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=self.completions))
+        for target, value in (
+            ("groq_client", client),
+            ("response_cache_redis", None),
+            ("RETRY_DELAY_SECONDS", 0),
+        ):
+            patcher = mock.patch.object(llama_client, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        llama_client._local_response_cache.clear()
+        llama_client._breaker_success()
+
+    async def test_retry_after_partial_stream_resets(self):
+        received = []
+        result = await llama_client.llama_reason_json(
+            prompt="plan", on_delta=received.append, on_reset=received.clear,
+        )
+        self.assertTrue(result["success"])
+        self.assertEqual(self.completions.calls, 2)
+        self.assertEqual("".join(received), result["content"])
+        self.assertEqual(result["content"], PLAN)
+
+    async def test_no_retry_after_partial_stream_without_reset(self):
+        received = []
+        result = await llama_client.llama_reason_json(prompt="plan", on_delta=received.append)
+        self.assertFalse(result["success"])
+        self.assertEqual(self.completions.calls, 1)
+        self.assertEqual("".join(received), PLAN[:14])
+
+    async def test_solution_stream_events(self):
+        import app
+        import planner
+
+        class Refined(types.SimpleNamespace):
+            def model_dump(self):
+                return dict(self.__dict__)
+
+        async def reasoner(analysis, session_id):
+            return True, Refined(requires_rag=True, rag_query="toilet clog"), None
+
+        docs = [{"rank": 1, "score": 0.9, "text": "plunge", "source": "t.md", "chunk_id": 0}]
+        with mock.patch.object(app, "refine_observation_and_build_query", reasoner), \
+                mock.patch.object(app, "rag_retrieve", lambda q, top_k=6: docs), \
+                mock.patch.object(app, "RAG_ENABLED", True), \
+                mock.patch.object(app, "LLAMA_ENABLED", True), \
+                mock.patch.object(planner, "_build_planner_prompt", lambda ro, d: "PROMPT"):
+            analysis = {"fixture_type": "toilet", "fixture": "toilet", "location": "bathroom",
+                        "prospected_issues": [{"issue_name": "Toilet clogged", "suspected_cause": "paper"}]}
+            text = ""
+            async for ev in app.toilet_solution_events(analysis, "s1", stream_plan=True):
+                if ev["event"] == "plan_reset":
+                    text = ""
+                elif ev["event"] == "plan_delta":
+                    text += ev["text"]
+        self.assertEqual(self.completions.calls, 2)
+        self.assertEqual(text, PLAN)
+
+
+class SyncShimTest(unittest.TestCase):
+    """llama_reason_sync: every asyncio.run gets its own client, closed before the loop goes."""
+
+    def test_throwaway_client_per_run(self):
+        made = []
+
+        def fake_groq(api_key, http_client):
+            completions = types.SimpleNamespace(create=mock.AsyncMock(return_value=types.SimpleNamespace(
+                choices=[types.SimpleNamespace(message=types.SimpleNamespace(content="OK"))],
+                usage=types.SimpleNamespace(total_tokens=3),
+            )))
+            made.append(http_client)
+            return types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+
+        with mock.patch.object(llama_client, "AsyncGroq", fake_groq), \
+                mock.patch.object(llama_client, "GROQ_API_KEY", "test"), \
+                mock.patch.object(llama_client, "groq_client", None), \
+                mock.patch.object(llama_client, "response_cache_redis", None):
+            llama_client._local_response_cache.clear()
+            llama_client._breaker_success()
+            for prompt in ("one", "two"):
+                result = llama_client.llama_reason_sync(prompt=prompt, json_mode=False)
+                self.assertTrue(result["success"])
+                self.assertEqual(result["content"], "OK")
+        self.assertEqual(len(made), 2)
+        self.assertIsNot(made[0], made[1])
+        self.assertTrue(all(http.is_closed for http in made))
+        self.assertIsNone(llama_client._loop_client.get())
+
+
+if __name__ == "__main__":
+    unittest.main()